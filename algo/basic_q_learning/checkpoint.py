@@ -0,0 +1,88 @@
+"""
+This module saves and loads `q_learning` checkpoints.
+A checkpoint directory holds one sub-directory per checkpoint and a `LATEST` file naming the newest complete one.
+Each checkpoint is written to a temporary directory and renamed into place before `LATEST` is replaced,
+so a partially written checkpoint is never loaded.
+    `
+    checkpoint_dir/
+    ├── LATEST
+    └── episode-000005000
+        ├── q_table.npy (loaded with memory mapping)
+        ├── state.pkl (episode, epsilon and RNG states)
+        └── metrics.pkl (training metrics recorded so far)
+    `
+"""
+import os
+import pickle
+import shutil
+import tempfile
+import numpy as np
+
+LATEST = "LATEST"
+
+
+def save_checkpoint(checkpoint_dir, q_table, state, metrics_state, keep=2):
+    """
+    Save a checkpoint atomically and remove the older ones
+    :param checkpoint_dir: checkpoint directory
+    :param q_table: Q-table
+    :param state: dictionary with at least "episode", pickled as it is
+    :param metrics_state: state of the training metrics, see `TrainingMetrics.state`
+    :param keep: number of most recent checkpoints to keep, the new one included
+    :return: path of the checkpoint
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    name = "episode-{:09d}".format(state.get("episode"))
+    path = os.path.join(checkpoint_dir, name)
+
+    temp_path = tempfile.mkdtemp(prefix=".tmp-", dir=checkpoint_dir)
+    np.save(os.path.join(temp_path, "q_table.npy"), q_table)
+    with open(os.path.join(temp_path, "state.pkl"), "wb") as file:
+        pickle.dump(state, file)
+    with open(os.path.join(temp_path, "metrics.pkl"), "wb") as file:
+        pickle.dump(metrics_state, file)
+    # a checkpoint of the same episode is moved aside rather than deleted, and only removed once replaced
+    old_path = os.path.join(checkpoint_dir, ".old-" + name)
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(temp_path, path)
+
+    # point to the new checkpoint only once it is complete
+    with open(os.path.join(checkpoint_dir, LATEST + ".tmp"), "w") as file:
+        file.write(name)
+    os.replace(
+        os.path.join(checkpoint_dir, LATEST + ".tmp"),
+        os.path.join(checkpoint_dir, LATEST),
+    )
+
+    shutil.rmtree(old_path, ignore_errors=True)
+
+    # only checkpoints older than the new one are pruned, later ones may be left by an earlier, longer run
+    previous = sorted(
+        entry
+        for entry in os.listdir(checkpoint_dir)
+        if entry.startswith("episode-") and entry < name
+    )
+    for entry in previous[: max(len(previous) - keep + 1, 0)]:
+        shutil.rmtree(os.path.join(checkpoint_dir, entry), ignore_errors=True)
+    return path
+
+
+def load_checkpoint(checkpoint_dir):
+    """
+    Load the latest complete checkpoint
+    :param checkpoint_dir: checkpoint directory
+    :return: dictionary with "q_table" (read-only memory map), "state" and "metrics_state"
+    """
+    with open(os.path.join(checkpoint_dir, LATEST)) as file:
+        path = os.path.join(checkpoint_dir, file.read().strip())
+    with open(os.path.join(path, "state.pkl"), "rb") as file:
+        state = pickle.load(file)
+    with open(os.path.join(path, "metrics.pkl"), "rb") as file:
+        metrics_state = pickle.load(file)
+    return {
+        "q_table": np.load(os.path.join(path, "q_table.npy"), mmap_mode="r"),
+        "state": state,
+        "metrics_state": metrics_state,
+    }
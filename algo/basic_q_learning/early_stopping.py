@@ -0,0 +1,112 @@
+"""
+This module contains the stop criteria of `q_learning`, checked at the end of every episode.
+    `
+    early_stopping = EarlyStopping(q_delta_threshold=1e-3, patience=50)
+    q_table, training_info = q_learning(env, penalty, max_eps, alpha, gamma, epsilon_start, early_stopping=early_stopping)
+    training_info.attrs["stop_reason"], training_info.attrs["stop_episode"]
+    `
+"""
+import collections
+import numpy as np
+
+
+class EarlyStopping:
+    """
+    Optional stop criteria, training stops at the first one which is met:
+    "q_delta": the largest Q-value update of an episode stays below a threshold for `patience` episodes
+    "return_plateau": the moving average of the episode return stops improving
+    "reference_policy": the greedy policy matches a reference policy
+    """
+
+    def __init__(
+        self,
+        q_delta_threshold=None,
+        patience=10,
+        return_window=None,
+        return_tolerance=0.0,
+        reference_policy=None,
+        states=None,
+        tol=1e-6,
+        match_rate=1.0,
+    ):
+        """
+        :param q_delta_threshold: threshold of the largest absolute Q-value update of an episode
+        :param patience: number of consecutive episodes below `q_delta_threshold` to stop
+        :param return_window: size of the moving average window of the episode return
+        :param return_tolerance: stop when the moving average improves by no more than this over one window
+        :param reference_policy: action of each state, or a Q-table (e.g. from `q_iteration`) in which case
+        any greedy action that is optimal within `tol` matches
+        :param states: states to compare with the reference policy, all states if not given,
+        the start states (`np.flatnonzero(env.init_state_distribution)`) are usually what we want
+        :param tol: tolerance when comparing with a reference Q-table
+        :param match_rate: share of `states` whose greedy action has to match
+        """
+        self.q_delta_threshold = q_delta_threshold
+        self.patience = patience
+        self.return_window = return_window
+        self.return_tolerance = return_tolerance
+        self.reference_policy = (
+            None if reference_policy is None else np.asarray(reference_policy)
+        )
+        self.states = states
+        self.tol = tol
+        self.match_rate = match_rate
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the history of the previous run
+        :return: None
+        """
+        self.calm_episodes = 0
+        self.returns = collections.deque(
+            maxlen=2 * self.return_window if self.return_window else None
+        )
+
+    def check(self, q_table, max_q_delta, total_reward):
+        """
+        Check the stop criteria at the end of an episode
+        :param q_table: current Q-table
+        :param max_q_delta: largest absolute Q-value update of the episode
+        :param total_reward: return of the episode
+        :return: stop reason, or None to continue
+        """
+        if self.q_delta_threshold is not None:
+            self.calm_episodes = (
+                self.calm_episodes + 1 if max_q_delta < self.q_delta_threshold else 0
+            )
+            if self.calm_episodes >= self.patience:
+                return "q_delta"
+
+        if self.return_window:
+            self.returns.append(total_reward)
+            if len(self.returns) == self.returns.maxlen:
+                returns = np.asarray(self.returns)
+                improvement = (
+                    returns[self.return_window :].mean()
+                    - returns[: self.return_window].mean()
+                )
+                if improvement <= self.return_tolerance:
+                    return "return_plateau"
+
+        if self.reference_policy is not None and self.matches_reference(q_table):
+            return "reference_policy"
+
+        return None
+
+    def matches_reference(self, q_table):
+        """
+        :param q_table: current Q-table
+        :return: whether the greedy policy of the Q-table matches the reference policy
+        """
+        states = np.arange(len(q_table)) if self.states is None else self.states
+        actions = np.argmax(q_table[states], axis=1)
+        if self.reference_policy.ndim == 1:
+            matches = actions == self.reference_policy[states]
+        else:
+            reference_q = self.reference_policy[states]
+            matches = (
+                reference_q[np.arange(len(states)), actions]
+                >= reference_q.max(axis=1) - self.tol
+            )
+        return bool(np.mean(matches) >= self.match_rate)
@@ -1,7 +1,13 @@
 import numpy as np
 import random
-from IPython.display import clear_output
+from algo.basic_q_learning.checkpoint import load_checkpoint, save_checkpoint
+from algo.basic_q_learning.training_metrics import (
+    Q_LEARNING_COLUMNS,
+    TrainingMetrics,
+    print_progress,
+)
 from algo.e_greedy.epsilon_greedy import get_epsilon
+from envs.vector_cab_env import VectorCabEnv
 
 import pandas as pd
 
@@ -14,17 +20,65 @@ def q_learning(
     epsilon_start,
     strategy="linear",
     epsilon_decay=None,
+    q_table=None,
+    metrics_path=None,
+    chunk_size=10000,
+    progress=print_progress,
+    progress_every=100,
+    early_stopping=None,
+    checkpoint_dir=None,
+    checkpoint_every=1000,
+    resume_from=None,
 ):
-    # initialise the q_table
-    q_table = np.zeros([env.observation_space.n, env.action_space.n])
+    """
+    One-step tabular Q-learning
+    :param env: environment
+    :param penalty: reward value counted as a penalty
+    :param max_eps: number of episodes
+    :param alpha: learning rate
+    :param gamma: discount factor
+    :param epsilon_start: starting epsilon
+    :param strategy: epsilon strategy, see `get_epsilon`
+    :param epsilon_decay: epsilon decay rate for exponential strategy
+    :param q_table: initial Q-table to warm-start from, zeros if not given
+    :param metrics_path: ".csv" or ".parquet" file to stream the training info to in chunks during training
+    :param chunk_size: number of episodes kept in memory between writes when streaming
+    :param progress: callback `progress(episode, max_eps)`, e.g. `print_progress`, `notebook_progress` or None
+    :param progress_every: number of episodes between progress callbacks
+    :param early_stopping: `EarlyStopping` criteria, all `max_eps` episodes are run if not given
+    :param checkpoint_dir: directory to save checkpoints to, no checkpoints if not given
+    :param checkpoint_every: number of episodes between checkpoints
+    :param resume_from: checkpoint directory to continue training from, with the same hyperparameters,
+    the history of `early_stopping` starts again from the resumed episode
+    :return: q_table, training_info, with `attrs["stop_reason"]` and `attrs["stop_episode"]`
+    """
+    # initialise the q_table, or warm-start from a given one (e.g. from `q_iteration`)
+    if q_table is None:
+        q_table = np.zeros([env.observation_space.n, env.action_space.n])
+    else:
+        q_table = np.array(q_table, dtype=np.float64)
 
     # initialise training information
-    num_step_info = []
-    num_penalty_info = []
-    total_reward_info = []
-    epsilon_info = []
+    metrics = TrainingMetrics(
+        max_eps,
+        dict(Q_LEARNING_COLUMNS, total_rewards=reward_dtype(env)),
+        metrics_path,
+        chunk_size,
+    )
+    stop_reason, stop_episode = "max_eps", max_eps
+    if early_stopping is not None:
+        early_stopping.reset()
+
+    # continue from the Q-table, episode counter, RNG states and metrics of a checkpoint
+    start_episode = 1
+    if resume_from is not None:
+        checkpoint = load_checkpoint(resume_from)
+        q_table = np.array(checkpoint.get("q_table"), dtype=np.float64)
+        start_episode = checkpoint.get("state").get("episode") + 1
+        restore_rng_states(env, checkpoint.get("state"))
+        metrics.restore(checkpoint.get("metrics_state"))
 
-    for episode in range(1, max_eps + 1):
+    for episode in range(start_episode, max_eps + 1):
         # reset the environment at the beginning of episode
         state = env.reset()
 
@@ -33,10 +87,14 @@ def q_learning(
             step_count,
             penalty_count,
             total_reward,
+            max_q_delta,
+            sum_q_delta,
         ) = (
             0,
             0,
             0,
+            0.0,
+            0.0,
         )
         termination = False
 
@@ -57,14 +115,19 @@ def q_learning(
             # obtain current state so that we won't lose it
             current_q = q_table[state, action]
 
-            # maximum expected future rewards
-            max_expected = np.max(q_table[new_state])
+            # maximum expected future rewards, a terminal state has none
+            max_expected = 0.0 if termination else np.max(q_table[new_state])
 
             # calculate Q-values and fill it
             new_q = (1 - alpha) * current_q + alpha * (reward + gamma * max_expected)
             q_table[state, action] = new_q
 
             # gather training info:
+            # size of the Q-value update
+            q_delta = abs(new_q - current_q)
+            max_q_delta = max(max_q_delta, q_delta)
+            sum_q_delta += q_delta
+
             # number of steps to complete the episode
             step_count += 1
 
@@ -78,26 +141,221 @@ def q_learning(
             # assign the new state
             state = new_state
 
-        num_step_info.append(step_count)
-        num_penalty_info.append(penalty_count)
-        total_reward_info.append(total_reward)
-        epsilon_info.append(epsilon)
+        metrics.record(
+            episode,
+            num_steps=step_count,
+            num_penalties=penalty_count,
+            total_rewards=total_reward,
+            epsilon=epsilon,
+            max_q_delta=max_q_delta,
+            mean_q_delta=sum_q_delta / step_count,
+        )
+
+        if progress is not None and episode % progress_every == 0:
+            progress(episode, max_eps)
+
+        if checkpoint_dir is not None and episode % checkpoint_every == 0:
+            save_checkpoint(
+                checkpoint_dir,
+                q_table,
+                dict(rng_states(env), episode=episode, epsilon=epsilon),
+                metrics.state(),
+            )
 
-        if episode % 100 == 0:
-            clear_output(wait=True)
-            print(f"Episode: {episode}")
+        if early_stopping is not None:
+            reason = early_stopping.check(q_table, max_q_delta, total_reward)
+            if reason is not None:
+                stop_reason, stop_episode = reason, episode
+                break
 
-    print("Training finished.\n")
+    print(f"\nTraining finished ({stop_reason} at episode {stop_episode}).\n")
 
     # gather training information
-    training_info = pd.DataFrame(
-        {
-            "episode": range(1, max_eps + 1),
-            "num_steps": num_step_info,
-            "num_penalties": num_penalty_info,
-            "total_rewards": total_reward_info,
-            "epsilon": epsilon_info,
-        }
+    training_info = metrics.to_frame()
+    training_info.attrs["stop_reason"] = stop_reason
+    training_info.attrs["stop_episode"] = stop_episode
+
+    return q_table, training_info
+
+
+def rng_states(env):
+    """
+    :param env: environment
+    :return: states of the random generators used by `q_learning`
+    """
+    return {
+        "random_state": random.getstate(),
+        "env_random_state": env.np_random.get_state(),
+        "action_random_state": env.action_space.np_random.get_state(),
+    }
+
+
+def restore_rng_states(env, states):
+    """
+    :param env: environment
+    :param states: states returned by `rng_states`
+    :return: None
+    """
+    random.setstate(states.get("random_state"))
+    env.np_random.set_state(states.get("env_random_state"))
+    env.action_space.np_random.set_state(states.get("action_random_state"))
+
+
+def reward_dtype(env):
+    """
+    :param env: environment
+    :return: dtype of the rewards, from the dynamics tables when the environment has them
+    """
+    reward_table = getattr(env, "reward_table", None)
+    return np.float64 if reward_table is None else reward_table.dtype
+
+
+def q_learning_batched(
+    env,
+    penalty,
+    max_eps,
+    alpha,
+    gamma,
+    epsilon_start,
+    strategy="linear",
+    epsilon_decay=None,
+    num_envs=256,
+    seed=None,
+    q_table=None,
+    progress=print_progress,
+    progress_every=100,
+):
+    """
+    Q-learning over a batch of episodes running in parallel on a `VectorCabEnv`.
+    Action selection, TD targets and the Q-table update are done for the whole batch as array operations.
+
+    Duplicate (state, action) pairs within one batch: every TD error is computed against the Q-table before the
+    batch, and the pair is updated once with the mean of its TD errors.
+    :param env: a `CabEnv` (or subclass) to take the dynamics tables from
+    :param penalty: reward value counted as a penalty
+    :param max_eps: total number of episodes
+    :param alpha: learning rate
+    :param gamma: discount factor
+    :param epsilon_start: starting epsilon
+    :param strategy: epsilon strategy, see `get_epsilon`
+    :param epsilon_decay: epsilon decay rate for exponential strategy
+    :param num_envs: number of episodes running in parallel
+    :param seed: random seed, the episode resets and the exploration get independent streams from it
+    :param q_table: initial Q-table to warm-start from, zeros if not given
+    :param progress: callback `progress(episode, max_eps)` or None
+    :param progress_every: number of finished episodes between progress callbacks
+    :return: q_table, training_info in the same format as `q_learning`
+    """
+    env_seed, action_seed = np.random.SeedSequence(seed).spawn(2)
+    vector_env = VectorCabEnv(env, num_envs, seed=env_seed)
+    rng = np.random.default_rng(action_seed)
+    num_action = vector_env.num_action
+
+    # initialise the q_table, or warm-start from a given one
+    if q_table is None:
+        q_table = np.zeros([vector_env.num_state, num_action])
+    else:
+        q_table = np.array(q_table, dtype=np.float64)
+
+    # initialise training information, episodes are recorded in the order they finish
+    metrics = TrainingMetrics(
+        max_eps, dict(Q_LEARNING_COLUMNS, total_rewards=reward_dtype(env))
+    )
+    epsilon_info = np.array(
+        [
+            get_epsilon(epsilon_start, max_eps, episode, strategy, epsilon_decay)
+            for episode in range(1, max_eps + 1)
+        ]
     )
 
-    return q_table, training_info
\ No newline at end of file
+    # episode of each slot (1-indexed), slots beyond `max_eps` are idle
+    slot_episode = np.arange(1, num_envs + 1)
+    next_episode = num_envs + 1
+    step_count = np.zeros(num_envs, dtype=np.int64)
+    penalty_count = np.zeros(num_envs, dtype=np.int64)
+    total_reward = np.zeros(num_envs, dtype=vector_env.reward_table.dtype)
+    max_q_delta = np.zeros(num_envs)
+    sum_q_delta = np.zeros(num_envs)
+
+    states = vector_env.reset()
+    finished = 0
+    while finished < max_eps:
+        active = slot_episode <= max_eps
+        epsilon = epsilon_info[np.minimum(slot_episode, max_eps) - 1]
+
+        # action selection based on epsilon
+        actions = np.argmax(q_table[states], axis=1)
+        explore = rng.random(num_envs) < epsilon
+        actions[explore] = rng.integers(0, num_action, np.count_nonzero(explore))
+
+        # gather new states from actions (finished episodes are already reset)
+        new_states, rewards, terminations = vector_env.step(actions)
+
+        # TD targets, a terminal state has no expected future rewards
+        targets = rewards + gamma * np.where(
+            terminations, 0.0, np.max(q_table[new_states], axis=1)
+        )
+        td_errors = targets - q_table[states, actions]
+
+        # scatter the mean TD error of each distinct (state, action) pair of the active slots
+        indices = (states * num_action + actions)[active]
+        unique_indices, inverse = np.unique(indices, return_inverse=True)
+        mean_td_errors = np.bincount(
+            inverse, weights=td_errors[active]
+        ) / np.bincount(inverse)
+        q_table.flat[unique_indices] += alpha * mean_td_errors
+
+        # gather training info:
+        # size of the Q-value update of the pair of each active slot
+        q_delta = np.zeros(num_envs)
+        q_delta[active] = np.abs(alpha * mean_td_errors)[inverse]
+        np.maximum(max_q_delta, q_delta, out=max_q_delta)
+        sum_q_delta += q_delta
+
+        step_count += 1
+        penalty_count += rewards == penalty
+        total_reward += rewards
+
+        done_slots = np.flatnonzero(terminations & active)
+        if len(done_slots):
+            for slot in done_slots:
+                episode = slot_episode[slot]
+                metrics.record(
+                    episode,
+                    num_steps=step_count[slot],
+                    num_penalties=penalty_count[slot],
+                    total_rewards=total_reward[slot],
+                    epsilon=epsilon_info[episode - 1],
+                    max_q_delta=max_q_delta[slot],
+                    mean_q_delta=sum_q_delta[slot] / step_count[slot],
+                )
+
+            step_count[done_slots] = 0
+            penalty_count[done_slots] = 0
+            total_reward[done_slots] = 0
+            max_q_delta[done_slots] = 0.0
+            sum_q_delta[done_slots] = 0.0
+            slot_episode[done_slots] = np.arange(
+                next_episode, next_episode + len(done_slots)
+            )
+            next_episode += len(done_slots)
+
+            if (
+                progress is not None
+                and (finished + len(done_slots)) // progress_every
+                > finished // progress_every
+            ):
+                progress(finished + len(done_slots), max_eps)
+            finished += len(done_slots)
+
+        # assign the new states
+        states = new_states
+
+    print("\nTraining finished.\n")
+
+    # gather training information in episode order
+    training_info = metrics.to_frame().sort_values("episode", ignore_index=True)
+    training_info.attrs["stop_reason"] = "max_eps"
+    training_info.attrs["stop_episode"] = max_eps
+
+    return q_table, training_info
@@ -0,0 +1,207 @@
+"""
+This module runs hyperparameter sweeps of `q_learning` across a process pool.
+Each worker builds its environment once and reuses it for every run it gets. Every finished run is saved to
+`output_dir`, so a killed sweep continues where it stopped when it is started again with the same arguments.
+    `
+    from algo.basic_q_learning.q_learning_sweep import run_sweep
+    results = run_sweep(
+        {"alpha": [0.1, 0.5], "gamma": [0.9, 0.99], "epsilon_start": [1.0], "strategy": ["linear"]},
+        seeds=[0, 1, 2],
+        output_dir="sweeps/cab",
+        max_eps=2000,
+    )
+    `
+"""
+import os
+import io
+import json
+import random
+import hashlib
+import itertools
+import contextlib
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from algo.basic_q_learning.q_learning import q_learning
+from envs.cab_env import CabEnv
+
+# hyperparameters of `q_learning` which can be swept
+SWEEP_PARAMS = ["alpha", "gamma", "epsilon_start", "strategy", "epsilon_decay"]
+
+# environment of the current worker process, built once by `init_worker`
+worker_env = None
+
+
+def grid_configs(space):
+    """
+    Every combination of the given values
+    :param space: dictionary of parameter name to list of values
+    :return: list of configs
+    """
+    names = list(space.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+
+
+def random_configs(space, num_samples, seed=None):
+    """
+    Random samples of the given space
+    :param space: dictionary of parameter name to list of values (sampled uniformly)
+    or to a (low, high) tuple (sampled uniformly in the range)
+    :param num_samples: number of configs
+    :param seed: random seed of the sampling
+    :return: list of configs
+    """
+    rng = random.Random(seed)
+    configs = []
+    for _ in range(num_samples):
+        configs.append(
+            {
+                name: rng.uniform(*values) if isinstance(values, tuple) else rng.choice(values)
+                for name, values in space.items()
+            }
+        )
+    return configs
+
+
+def run_id(config, seed, max_eps, penalty, env_class):
+    """
+    :param config: config of the run
+    :param seed: seed of the run
+    :param max_eps: number of training episodes
+    :param penalty: reward value counted as a penalty
+    :param env_class: environment class
+    :return: identifier of the run, stable across restarts and different for every setup
+    """
+    definition = json.dumps(
+        {
+            "config": config,
+            "seed": seed,
+            "max_eps": max_eps,
+            "penalty": penalty,
+            "env_class": f"{env_class.__module__}.{env_class.__qualname__}",
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(definition.encode("utf-8")).hexdigest()[:16]
+
+
+def init_worker(env_class, cache_dir):
+    """
+    Build the environment once per worker process
+    :param env_class: environment class
+    :param cache_dir: cache directory of the compiled dynamics
+    :return: None
+    """
+    global worker_env
+    worker_env = env_class(cache_dir)
+
+
+def run_single(config, seed, penalty, max_eps, path):
+    """
+    Train one config with one seed on the environment of the worker and save its training info
+    :param config: dictionary of `q_learning` hyperparameters
+    :param seed: random seed
+    :param penalty: reward value counted as a penalty
+    :param max_eps: number of training episodes
+    :param path: file to save the training info to
+    :return: path
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    worker_env.seed(seed)
+    worker_env.action_space.seed(seed)
+
+    # the training progress of the workers is not printed
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, training_info = q_learning(
+            worker_env, penalty, max_eps, progress=None, **config
+        )
+
+    # write then rename, so that a partial result is never loaded
+    training_info.to_pickle(path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def run_sweep(
+    space,
+    seeds,
+    output_dir,
+    max_eps,
+    penalty=None,
+    search="grid",
+    num_samples=None,
+    sample_seed=0,
+    num_workers=None,
+    env_class=CabEnv,
+    cache_dir=None,
+):
+    """
+    Run every config and seed of a grid or random search over a process pool
+    :param space: dictionary of `q_learning` hyperparameter name to values, see `grid_configs` and `random_configs`
+    :param seeds: list of random seeds, every config is trained once per seed
+    :param output_dir: directory to save the result of each run, finished runs are skipped on restart
+    :param max_eps: number of training episodes of each run
+    :param penalty: reward value counted as a penalty, the "penalty" of the environment reward if not given
+    :param search: "grid" or "random"
+    :param num_samples: number of configs of random search
+    :param sample_seed: random seed of random search sampling
+    :param num_workers: number of worker processes, all cores if not given
+    :param env_class: environment class
+    :param cache_dir: cache directory of the compiled dynamics, shared by all workers
+    :return: DataFrame of the training info of every run, with the config and seed as columns
+    """
+    unknown = set(space) - set(SWEEP_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+    if search == "grid":
+        configs = grid_configs(space)
+    elif search == "random":
+        if num_samples is None:
+            raise ValueError("Number of samples required for random search")
+        configs = random_configs(space, num_samples, sample_seed)
+    else:
+        raise ValueError("The search should be grid or random")
+    if penalty is None:
+        penalty = env_class.reward_dict.get("penalty")
+
+    os.makedirs(output_dir, exist_ok=True)
+    runs = [
+        (
+            config,
+            seed,
+            os.path.join(
+                output_dir, run_id(config, seed, max_eps, penalty, env_class) + ".pkl"
+            ),
+        )
+        for config in configs
+        for seed in seeds
+    ]
+    pending = [run for run in runs if not os.path.exists(run[2])]
+    print(f"Runs: {len(runs)}, finished before: {len(runs) - len(pending)}")
+
+    if pending:
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=init_worker,
+            initargs=(env_class, cache_dir),
+        ) as executor:
+            futures = [
+                executor.submit(run_single, config, seed, penalty, max_eps, path)
+                for config, seed, path in pending
+            ]
+            for finished, future in enumerate(as_completed(futures), start=1):
+                future.result()
+                print(f"Finished: {finished}/{len(pending)}")
+
+    # gather training information of every run into one table
+    results = []
+    for config, seed, path in runs:
+        training_info = pd.read_pickle(path)
+        for name in SWEEP_PARAMS:
+            training_info[name] = config.get(name)
+        training_info["seed"] = seed
+        training_info["run_id"] = os.path.basename(path)[: -len(".pkl")]
+        results.append(training_info)
+    return pd.concat(results, ignore_index=True)
@@ -0,0 +1,226 @@
+"""
+This module records per-episode training metrics into preallocated typed arrays.
+Metrics can be streamed to disk in chunks (CSV or Parquet) during training, so that the memory of long runs
+stays bounded by the chunk size. A ".parquet" path is a directory with one finished part file per chunk,
+so the episodes written before a crash can still be read.
+    `
+    metrics = TrainingMetrics(max_eps, {"num_steps": np.int64, "epsilon": np.float64}, path="logs/run.csv")
+    metrics.record(episode, num_steps=12, epsilon=0.5)
+    training_info = metrics.to_frame()
+    `
+"""
+import os
+import numpy as np
+import pandas as pd
+
+# default metrics of `q_learning`, "episode" is always recorded as the first column
+Q_LEARNING_COLUMNS = {
+    "num_steps": np.int64,
+    "num_penalties": np.int64,
+    "total_rewards": np.float64,
+    "epsilon": np.float64,
+    "max_q_delta": np.float64,
+    "mean_q_delta": np.float64,
+}
+
+
+class TrainingMetrics:
+    """
+    Per-episode metrics in preallocated arrays.
+    Without a path, all episodes are kept in memory. With a path, the arrays hold one chunk and are appended to
+    the file each time they are full.
+    """
+
+    def __init__(self, max_eps, columns, path=None, chunk_size=10000):
+        """
+        :param max_eps: maximum number of episodes
+        :param columns: dictionary of metric name to dtype
+        :param path: file to stream the metrics to, ".csv" or ".parquet" (a directory of part files),
+        in memory only if not given
+        :param chunk_size: number of episodes per chunk when streaming
+        """
+        if path is not None and not path.endswith((".csv", ".parquet")):
+            raise ValueError("The metrics file should be .csv or .parquet")
+        self.path = path
+        self.capacity = max_eps if path is None else min(chunk_size, max_eps)
+        self.arrays = {"episode": np.zeros(self.capacity, dtype=np.int64)}
+        self.arrays.update(
+            {name: np.zeros(self.capacity, dtype=dtype) for name, dtype in columns.items()}
+        )
+        self.size = 0
+        self.num_flushed = 0
+
+    def __len__(self):
+        return self.num_flushed + self.size
+
+    def record(self, episode, **values):
+        """
+        Record the metrics of one episode
+        :param episode: episode number
+        :param values: metric name to value
+        :return: None
+        """
+        if self.size == self.capacity:
+            self.flush()
+        self.arrays["episode"][self.size] = episode
+        for name, value in values.items():
+            self.arrays[name][self.size] = value
+        self.size += 1
+
+    def chunk(self):
+        """
+        :return: DataFrame of the episodes which are in memory
+        """
+        return pd.DataFrame(
+            {name: array[: self.size] for name, array in self.arrays.items()}
+        )
+
+    def flush(self):
+        """
+        Append the episodes in memory to the file and empty the arrays, nothing is done without a file
+        :return: None
+        """
+        if self.path is None or self.size == 0:
+            return
+        self.write(self.chunk())
+        self.num_flushed += self.size
+        self.size = 0
+
+    def write(self, frame):
+        """
+        Append rows to the file, the file is overwritten by the first write of a run
+        :param frame: DataFrame of episodes
+        :return: None
+        """
+        first = self.num_flushed == 0
+        if self.path.endswith(".csv"):
+            frame.to_csv(self.path, mode="w" if first else "a", header=first, index=False)
+            return
+
+        # Parquet is an optional dependency
+        import pyarrow
+        import pyarrow.parquet
+
+        if first and os.path.isfile(self.path):
+            os.remove(self.path)
+        elif first:
+            self.remove_parts(0)
+        os.makedirs(self.path, exist_ok=True)
+        # every part is a complete file, named after the number of episodes before it
+        part = os.path.join(self.path, "part-{:09d}.parquet".format(self.num_flushed))
+        pyarrow.parquet.write_table(
+            pyarrow.Table.from_pandas(frame, preserve_index=False), part
+        )
+
+    def parts(self):
+        """
+        :return: sorted list of (number of episodes before the part, path) of the Parquet part files
+        """
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(
+            (int(name[len("part-") : -len(".parquet")]), os.path.join(self.path, name))
+            for name in os.listdir(self.path)
+            if name.startswith("part-") and name.endswith(".parquet")
+        )
+
+    def remove_parts(self, start):
+        """
+        Remove the Parquet part files from episode offset `start` on
+        :param start: number of episodes to keep
+        :return: None
+        """
+        for offset, part in self.parts():
+            if offset >= start:
+                os.remove(part)
+
+    def read(self):
+        """
+        :return: DataFrame of the episodes in the file
+        """
+        if self.path.endswith(".csv"):
+            return pd.read_csv(self.path, float_precision="round_trip")
+        return pd.concat(
+            [pd.read_parquet(part) for _, part in self.parts()], ignore_index=True
+        )
+
+    def state(self):
+        """
+        Flush to the file and return what is needed to continue recording later, see `restore`
+        :return: dictionary of the number of episodes in the file and the arrays of the episodes in memory
+        """
+        self.flush()
+        return {
+            "num_flushed": self.num_flushed,
+            "arrays": {name: array[: self.size].copy() for name, array in self.arrays.items()},
+        }
+
+    def restore(self, state):
+        """
+        Continue recording from a state returned by `state`, the file is cut back to the episodes of that state
+        :param state: dictionary returned by `state`
+        :return: None
+        """
+        num_flushed = state.get("num_flushed")
+        if num_flushed and self.path is None:
+            raise ValueError(
+                "The metrics path should be given to resume a run whose metrics were streamed to a file"
+            )
+        self.size, self.num_flushed = 0, 0
+        if num_flushed and self.path.endswith(".csv"):
+            self.write(self.read().head(num_flushed))
+        elif num_flushed:
+            # parts written after the state was taken are dropped, a part is only rewritten if it goes past it
+            self.remove_parts(num_flushed)
+            if not self.parts():
+                raise ValueError("The metrics directory should hold the part files of the resumed run")
+            offset, part = self.parts()[-1]
+            frame = pd.read_parquet(part)
+            if offset + len(frame) > num_flushed:
+                self.num_flushed = offset
+                self.write(frame.head(num_flushed - offset))
+        self.num_flushed = num_flushed or 0
+        for name, array in state.get("arrays").items():
+            self.arrays[name][: len(array)] = array
+            self.size = len(array)
+
+    def close(self):
+        """
+        Flush the remaining episodes, every part file is already complete
+        :return: None
+        """
+        self.flush()
+
+    def to_frame(self):
+        """
+        :return: DataFrame of every recorded episode, read back from the file when streaming
+        """
+        if self.path is None:
+            return self.chunk()
+        self.close()
+        if self.num_flushed == 0:
+            return self.chunk()
+        return self.read()
+
+
+def print_progress(episode, max_eps):
+    """
+    Default progress callback, overwrites one line in scripts and notebooks alike
+    :param episode: current episode
+    :param max_eps: maximum number of episodes
+    :return: None
+    """
+    print(f"\rEpisode: {episode}/{max_eps}", end="", flush=True)
+
+
+def notebook_progress(episode, max_eps):
+    """
+    Progress callback which clears the IPython output first
+    :param episode: current episode
+    :param max_eps: maximum number of episodes
+    :return: None
+    """
+    from IPython.display import clear_output
+
+    clear_output(wait=True)
+    print(f"Episode: {episode}")
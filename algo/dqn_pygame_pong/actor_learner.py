@@ -0,0 +1,288 @@
+"""
+This module contains a local actor-learner setup for the Pong DQN, with no Ray dependency.
+Several actor processes each step a `VectorPong` of many games with a NumPy copy of the policy, and write chunks of
+experience into shared-memory slots. Only slot numbers go through the queues. The learner memorises every chunk
+into its replay memory, trains the `DQN` on the `TrainingScheduler` cadence, and periodically broadcasts the weights
+back to the actors through shared memory.
+
+Actors are started with "spawn" and never import TensorFlow, only the learner does. As "spawn" imports the main
+module again in every actor, a script starting the actors must not import TensorFlow at module level either,
+see `dqn_pong_perform`.
+    `
+    from algo.dqn_pygame_pong.actor_learner import train_actor_learner
+    _agent, scheduler, history = train_actor_learner(num_actors=4, games_per_actor=32, max_frames=200000)
+    `
+"""
+import multiprocessing
+import queue
+import time
+import numpy as np
+
+from algo.dqn_pygame_pong.numpy_policy import (
+    apex_epsilons,
+    epsilon_greedy,
+    flatten_layers,
+    unflatten_layers,
+)
+from envs.vector_pong_env import VectorPong
+
+STATE_COUNT = 5
+ACTION_COUNT = 3
+
+# columns of an experience row: state, action, reward, next state, done
+COLUMN_COUNT = 2 * STATE_COUNT + 3
+
+
+def slot_view(buffer, slots_per_actor, rows):
+    """
+    :param buffer: shared float32 buffer of one actor
+    :param slots_per_actor: number of slots
+    :param rows: number of experiences per slot
+    :return: array view of shape (slots_per_actor, rows, COLUMN_COUNT)
+    """
+    return np.frombuffer(buffer, dtype=np.float32).reshape(slots_per_actor, rows, COLUMN_COUNT)
+
+
+def split_rows(rows):
+    """
+    :param rows: experience rows, see `COLUMN_COUNT`
+    :return: (states, actions, rewards, next_states, dones) arrays
+    """
+    return (
+        rows[:, :STATE_COUNT],
+        rows[:, STATE_COUNT].astype(np.int64),
+        rows[:, STATE_COUNT + 1],
+        rows[:, STATE_COUNT + 2 : 2 * STATE_COUNT + 2],
+        rows[:, -1] > 0.5,
+    )
+
+
+def run_actor(
+    actor_id,
+    games_per_actor,
+    chunk_steps,
+    slots_per_actor,
+    buffer,
+    free_slots,
+    full_slots,
+    weights,
+    weights_version,
+    weights_lock,
+    weights_layout,
+    epsilon,
+    stop_event,
+    seed,
+):
+    """
+    Actor process: play `games_per_actor` games epsilon-greedily and fill free slots with `chunk_steps` steps each
+    :param actor_id: index of the actor
+    :param games_per_actor: number of games of the actor
+    :param chunk_steps: number of steps of every game per slot
+    :param slots_per_actor: number of slots of the actor
+    :param buffer: shared float32 buffer of the actor's slots
+    :param free_slots: queue of the actor's free slot numbers
+    :param full_slots: queue of (actor_id, slot) shared by every actor
+    :param weights: shared float32 buffer of the flat policy weights
+    :param weights_version: shared counter, incremented by every broadcast
+    :param weights_lock: lock of `weights`
+    :param weights_layout: (shapes, activations) of the flat weights, see `flatten_layers`
+    :param epsilon: shared exploration rate, or fixed exploration rates of the games
+    :param stop_event: set by the learner to stop the actor
+    :param seed: random seed, None for a random one
+    :return: None
+    """
+    slots = slot_view(buffer, slots_per_actor, chunk_steps * games_per_actor)
+    flat_weights = np.frombuffer(weights, dtype=np.float32)
+    env = VectorPong(games_per_actor, seed=seed)
+    np_random = np.random.default_rng(None if seed is None else seed + 1)
+    states = env.reset()
+    layers, version = None, 0
+
+    while not stop_event.is_set():
+        try:
+            slot = free_slots.get(timeout=0.1)
+        except queue.Empty:
+            continue
+
+        # pick up the latest broadcast weights
+        if weights_version.value != version:
+            with weights_lock:
+                version = weights_version.value
+                layers = unflatten_layers(flat_weights, *weights_layout)
+
+        rows = slots[slot]
+        epsilons = epsilon if isinstance(epsilon, np.ndarray) else epsilon.value
+        for step in range(chunk_steps):
+            actions = epsilon_greedy(layers, states, epsilons, np_random, ACTION_COUNT)
+            next_states, scores = env.step(actions)
+
+            chunk = rows[step * games_per_actor : (step + 1) * games_per_actor]
+            chunk[:, :STATE_COUNT] = states
+            chunk[:, STATE_COUNT] = actions
+            chunk[:, STATE_COUNT + 1] = scores
+            chunk[:, STATE_COUNT + 2 : 2 * STATE_COUNT + 2] = next_states
+            chunk[:, -1] = 0.0  # Pong games do not terminate
+            states = next_states
+        full_slots.put((actor_id, slot))
+
+    # slots still queued when the learner stops are not needed, do not wait for them to be flushed
+    full_slots.cancel_join_thread()
+
+
+def update_score_display(score_display, rewards):
+    """
+    Moving average of the scores, the same as `PongGame.score_display` applied to every non-zero reward in order
+    :param score_display: current average
+    :param rewards: rewards of a chunk
+    :return: new average
+    """
+    scores = rewards[rewards != 0]
+    decay = 0.95 ** np.arange(len(scores) - 1, -1, -1)
+    return 0.95 ** len(scores) * score_display + float(np.sum(0.05 * scores * decay))
+
+
+def next_full_slot(full_slots, actors, timeout=1.0):
+    """
+    Wait for the next filled slot, checking that the actors are still running
+    :param full_slots: queue of (actor_id, slot) shared by every actor
+    :param actors: actor processes
+    :param timeout: number of seconds between checks of the actors
+    :return: (actor_id, slot)
+    """
+    while True:
+        try:
+            return full_slots.get(timeout=timeout)
+        except queue.Empty:
+            for actor_id, actor in enumerate(actors):
+                if not actor.is_alive():
+                    raise RuntimeError(
+                        f"Actor {actor_id} stopped with exit code {actor.exitcode}"
+                    )
+
+
+def train_actor_learner(
+    num_actors=2,
+    games_per_actor=32,
+    chunk_steps=16,
+    slots_per_actor=2,
+    max_frames=200000,
+    broadcast_every=10,
+    agent_kwargs=None,
+    scheduler_kwargs=None,
+    seed=None,
+    progress_every=10000,
+    apex_epsilon=False,
+):
+    """
+    Train a DQN agent from several actor processes
+    :param num_actors: number of actor processes, usually one per spare CPU core
+    :param games_per_actor: number of games stepped together by each actor
+    :param chunk_steps: number of steps of every game per chunk of experience
+    :param slots_per_actor: number of shared-memory slots per actor, 2 lets an actor fill one while the other is read
+    :param max_frames: number of frames (game steps) to collect
+    :param broadcast_every: number of training steps between weight broadcasts to the actors
+    :param agent_kwargs: keyword arguments of `Agent`
+    :param scheduler_kwargs: keyword arguments of `TrainingScheduler`
+    :param seed: random seed of the actors, None for random ones
+    :param progress_every: number of frames between progress prints
+    :param apex_epsilon: give every game a fixed exploration rate from `apex_epsilons` over all games,
+    instead of the decayed epsilon of the agent
+    :return: (agent, scheduler, history), history is a list of (frame, score, epsilon)
+    """
+    # TensorFlow is only imported by the learner
+    from algo.dqn_pygame_pong.agent import Agent
+    from algo.dqn_pygame_pong.training_scheduler import TrainingScheduler
+
+    _agent = Agent(STATE_COUNT, ACTION_COUNT, **(agent_kwargs or {}))
+    scheduler = TrainingScheduler(_agent, **(scheduler_kwargs or {}))
+
+    context = multiprocessing.get_context("spawn")
+    rows = chunk_steps * games_per_actor
+    flat, shapes, activations = flatten_layers(_agent.net.numpy_layers)
+    weights = context.RawArray("f", len(flat))
+    weights_version = context.Value("l", 0)
+    weights_lock = context.Lock()
+    epsilon = context.Value("d", _agent.epsilon)
+    game_epsilons = apex_epsilons(num_actors * games_per_actor)
+    stop_event = context.Event()
+    full_slots = context.Queue()
+
+    def broadcast():
+        flat_weights = np.frombuffer(weights, dtype=np.float32)
+        with weights_lock:
+            flat_weights[:] = flatten_layers(_agent.net.numpy_layers)[0]
+            weights_version.value += 1
+
+    # the actors act with the initial network until the first update is broadcast
+    broadcast()
+
+    buffers, free_queues, actors = [], [], []
+    for actor_id in range(num_actors):
+        buffer = context.RawArray("f", slots_per_actor * rows * COLUMN_COUNT)
+        free_slots = context.Queue()
+        for slot in range(slots_per_actor):
+            free_slots.put(slot)
+        actor = context.Process(
+            target=run_actor,
+            args=(
+                actor_id,
+                games_per_actor,
+                chunk_steps,
+                slots_per_actor,
+                buffer,
+                free_slots,
+                full_slots,
+                weights,
+                weights_version,
+                weights_lock,
+                (shapes, activations),
+                game_epsilons[actor_id * games_per_actor : (actor_id + 1) * games_per_actor]
+                if apex_epsilon
+                else epsilon,
+                stop_event,
+                None if seed is None else seed + 2 * actor_id,
+            ),
+            daemon=True,
+        )
+        actor.start()
+        buffers.append(slot_view(buffer, slots_per_actor, rows))
+        free_queues.append(free_slots)
+        actors.append(actor)
+
+    history, score_display, frame = [], -10.0, 0
+    last_broadcast = 0
+    start = time.perf_counter()
+    try:
+        while frame < max_frames:
+            actor_id, slot = next_full_slot(full_slots, actors)
+            batch = split_rows(buffers[actor_id][slot])
+            _agent.record_experiences(*batch)
+            score_display = update_score_display(score_display, batch[2])
+            # the rows are views of the slot, they must not be read once the actor may refill it
+            free_queues[actor_id].put(slot)
+
+            epsilon.value = _agent.epsilon
+
+            scheduler.step(rows)
+            if scheduler.gradient_step_count - last_broadcast >= broadcast_every:
+                broadcast()
+                last_broadcast = scheduler.gradient_step_count
+
+            if frame // progress_every < (frame + rows) // progress_every:
+                print(
+                    f"\nFrame: {frame + rows}"
+                    f"\nScore: {score_display: .2f}"
+                    f"\nEpsilon: {_agent.epsilon}"
+                    f"\nFrames per second: {(frame + rows) / (time.perf_counter() - start):.0f}"
+                )
+                history.append((frame + rows, score_display, _agent.epsilon))
+            frame += rows
+    finally:
+        _agent.close()
+        stop_event.set()
+        for actor in actors:
+            actor.join(timeout=5)
+            if actor.is_alive():
+                actor.terminate()
+
+    return _agent, scheduler, history
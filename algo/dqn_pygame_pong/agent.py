@@ -3,8 +3,12 @@ This module contains the training agent which utilise neural network and replay
 """
 import random
 import math
+import threading
 import numpy as np
+from algo.dqn_pygame_pong.batch_prefetcher import BatchPrefetcher
 from algo.dqn_pygame_pong.dqn import DQN
+from algo.dqn_pygame_pong.numpy_policy import epsilon_greedy
+from algo.dqn_pygame_pong.prioritized_replay_memory import PrioritizedReplayMemory
 from algo.dqn_pygame_pong.replay_memory import ReplayMemory
 
 
@@ -18,6 +22,14 @@ EPSILON_START = 1
 EPSILON_MIN = 0.05
 EPSILON_DECAY_RATE = 0.0005
 
+# prioritized experience replay
+PRIORITY_ALPHA = 0.6
+PRIORITY_BETA_START = 0.4
+PRIORITY_BETA_FRAMES = 20000
+
+# number of training steps between copies of the policy network to the target network
+TARGET_SYNC_PERIOD = 500
+
 
 class Agent:
     """
@@ -25,14 +37,62 @@ class Agent:
     The agent uses a neural network to estimate the Q-value function and employs experience replay and a
     target network to improve training stability.
     """
-    def __init__(self, _num_state, _num_action):
+    def __init__(
+        self,
+        _num_state,
+        _num_action,
+        prioritized=False,
+        target_sync_period=None,
+        double_dqn=False,
+        compiled=True,
+        prefetch=False,
+    ):
+        """
+        :param _num_state: size of a state
+        :param _num_action: number of actions
+        :param prioritized: use prioritized experience replay instead of uniform sampling
+        :param target_sync_period: number of training steps between syncs of a separate target network,
+        e.g. `TARGET_SYNC_PERIOD`, the policy network gives the targets itself if None
+        :param double_dqn: select the next action with the policy network and evaluate it with the target network
+        :param compiled: train with the compiled step of `DQN.compile_train_step` instead of `predict` and `fit`
+        :param prefetch: prepare the next batch on a background thread, see `BatchPrefetcher`
+        """
         self.num_state = _num_state
         self.num_action = _num_action
+        self.prioritized = prioritized
+        self.target_sync_period = target_sync_period
+        self.double_dqn = double_dqn
+        self.compiled = compiled
 
         self.net = DQN(_num_state, _num_action)
-        self.experience_memory = ReplayMemory(REPLAY_MEMORY_SIZE)
+        self.target_net = None
+        if self.target_sync_period:
+            self.target_net = DQN(_num_state, _num_action)
+            self.target_net.sync_from(self.net)
+        if self.compiled:
+            self.net.compile_train_step(GAMMA, self.target_net, self.double_dqn)
+        self.train_step = 0
+        if self.prioritized:
+            self.experience_memory = PrioritizedReplayMemory(
+                REPLAY_MEMORY_SIZE,
+                _num_state,
+                alpha=PRIORITY_ALPHA,
+                beta_start=PRIORITY_BETA_START,
+                beta_frames=PRIORITY_BETA_FRAMES,
+            )
+        else:
+            self.experience_memory = ReplayMemory(REPLAY_MEMORY_SIZE, _num_state)
+
+        # every write to the memory is locked, as the prefetcher samples it concurrently
+        self.memory_lock = threading.Lock()
+        self.prefetcher = None
+        if prefetch:
+            self.prefetcher = BatchPrefetcher(
+                self.experience_memory, REPLAY_BATCH_SIZE, self.memory_lock, self.prioritized
+            )
         self.observation_idx = 0
         self.epsilon = EPSILON_START
+        self.np_random = np.random.default_rng()
 
     def select_action(self, state):
         """
@@ -44,14 +104,50 @@ class Agent:
             return random.randint(0, self.num_action - 1)
         return np.argmax(self.net._predict_single(state))
 
+    def select_actions(self, states, epsilons=None):
+        """
+        Batched action selection based on epsilon greedy, with one forward pass for every state
+        :param states: states, shape (batch, num_state), e.g. from `VectorPong`
+        :param epsilons: exploration rate of every state (e.g. `apex_epsilons`) or a single one,
+        the decayed epsilon of the agent if None, actions are random during `MEMORISE_DURATION` either way
+        :return: actions, shape (batch,)
+        """
+        if self.observation_idx < MEMORISE_DURATION:
+            epsilons = 1.0
+        elif epsilons is None:
+            epsilons = self.epsilon
+        return epsilon_greedy(
+            self.net.numpy_layers, states, epsilons, self.np_random, self.num_action
+        )
+
     def record_experience(self, experience):
         """
         Record an experience to memory
         :param experience:
         :return: None
         """
-        self.experience_memory.memorise(experience)
-        self.observation_idx += 1
+        with self.memory_lock:
+            self.experience_memory.memorise(experience)
+        self.count_observations(1)
+
+    def record_experiences(self, states, actions, rewards, next_states, dones):
+        """
+        Record a batch of experiences to memory, see `ReplayMemory.memorise_batch`
+        :return: None
+        """
+        with self.memory_lock:
+            self.experience_memory.memorise_batch(
+                states, actions, rewards, next_states, dones
+            )
+        self.count_observations(len(actions))
+
+    def count_observations(self, count):
+        """
+        Count observations and decay epsilon, e.g. for experiences memorised in a batch
+        :param count: number of new observations
+        :return: None
+        """
+        self.observation_idx += count
         if self.observation_idx > MEMORISE_DURATION:
             self.epsilon = EPSILON_MIN + (EPSILON_START - EPSILON_MIN) * math.exp(
                 -EPSILON_DECAY_RATE * (self.observation_idx - MEMORISE_DURATION)
@@ -59,39 +155,106 @@ class Agent:
 
     def train(self):
         """
-        Training algorithm
-        :return:
+        Training algorithm: sample a batch from the memory and train on it
+        :return: None
         """
-        batch = self.experience_memory.sample(REPLAY_BATCH_SIZE)
-        _batch_size = len(batch)
+        if self.prefetcher is not None:
+            indices, batch, sample_weight = self.prefetcher.get()
+        else:
+            indices = self.experience_memory.sample_indices(REPLAY_BATCH_SIZE)
+            batch = self.experience_memory.gather(indices)
 
-        _state = np.zeros(self.num_state)
+            # importance-sampling weights correct the bias of prioritized sampling
+            sample_weight = None
+            if self.prioritized:
+                sample_weight = self.experience_memory.importance_weights(indices)
 
-        current_state = np.array([item[0] for item in batch])
-        target_state = np.array(
-            [(_state if item[3] is None else item[3]) for item in batch]
-        ) # 3 is the number of action
+        td_errors = self.train_on_batch(*batch, sample_weight=sample_weight)
 
-        policy_q = self.net._predict(current_state)
-        target_q = self.net._predict(target_state)
+        if self.prioritized:
+            with self.memory_lock:
+                self.experience_memory.update_priorities(indices, td_errors)
 
-        x = np.zeros((_batch_size, self.num_state))
-        y = np.zeros((_batch_size, self.num_action))
+    def compute_targets(self, current_state, actions, rewards, target_state, dones):
+        """
+        Q-learning targets of a batch, a terminal state has no expected future rewards
+        :param current_state: states, shape (batch, num_state)
+        :param actions: actions, shape (batch,)
+        :param rewards: rewards, shape (batch,)
+        :param target_state: next states, shape (batch, num_state)
+        :param dones: terminal mask, shape (batch,)
+        :return: (policy_q, td_errors), the predicted Q-values with the taken actions replaced by their targets,
+        and the TD errors of the taken actions
+        """
+        _batch_size = len(actions)
+        rows = np.arange(_batch_size)
+
+        # one prediction of the policy network for the states and next states together
+        q_values = self.net._predict(np.concatenate([current_state, target_state]))
+        policy_q, next_policy_q = q_values[:_batch_size], q_values[_batch_size:]
+        target_q = (
+            next_policy_q if self.target_net is None else self.target_net._predict(target_state)
+        )
 
-        for i in range(_batch_size):
-            batch_item = batch[i]
-            state = batch_item[0]
-            a = batch_item[1]
-            reward = batch_item[2]
-            next_state = batch_item[3]
+        if self.double_dqn:
+            next_q = target_q[rows, np.argmax(next_policy_q, axis=1)]
+        else:
+            next_q = np.max(target_q, axis=1)
+        targets = rewards + GAMMA * np.where(dones, 0.0, next_q)
 
-            q_value = policy_q[i]
-            if next_state is None:
-                q_value[a] = reward
-            else:
-                q_value[a] = reward + GAMMA * np.amax(target_q[i])
+        td_errors = targets - policy_q[rows, actions]
+        policy_q[rows, actions] = targets
+        return policy_q, td_errors
+
+    def train_on_batch(
+        self, current_state, actions, rewards, target_state, dones, sample_weight=None
+    ):
+        """
+        One training step on a batch of arrays, see `compute_targets`
+        :param sample_weight: weight of each sample in the loss
+        :return: TD errors of the batch
+        """
+        if self.compiled:
+            td_errors = self.net._train(
+                current_state, actions, rewards, target_state, dones, sample_weight
+            )
+        else:
+            policy_q, td_errors = self.compute_targets(
+                current_state, actions, rewards, target_state, dones
+            )
+            self.net._fit(current_state, policy_q, _sample_weight=sample_weight)
 
-            x[i] = state
-            y[i] = q_value
+        self.train_step += 1
+        if self.target_sync_period and self.train_step % self.target_sync_period == 0:
+            self.sync_target()
+        return td_errors
 
-        self.net._fit(x, y)
+    def close(self):
+        """
+        Stop the background prefetcher, if any
+        :return: None
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+            self.prefetcher = None
+
+    def sync_target(self):
+        """
+        Copy the policy network to the target network
+        :return: None
+        """
+        self.target_net.sync_from(self.net)
+
+    def create_target_net(self):
+        """
+        Give the targets by a separate target network which is only synced by calls of `sync_target`,
+        e.g. from `TrainingScheduler`, the agent's own `target_sync_period` is turned off
+        :return: None
+        """
+        self.target_sync_period = None
+        if self.target_net is not None:
+            return
+        self.target_net = DQN(self.num_state, self.num_action)
+        self.target_net.sync_from(self.net)
+        if self.compiled:
+            self.net.compile_train_step(GAMMA, self.target_net, self.double_dqn)
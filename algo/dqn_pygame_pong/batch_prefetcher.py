@@ -0,0 +1,158 @@
+"""
+This module prepares replay batches on a background thread, so sampling and the batch array assembly are done while
+the environment steps instead of between frames.
+Two preallocated batch buffers are used in turn: while the learner trains on one, the thread fills the other,
+including its indices and importance-sampling weights for prioritized replay.
+Nothing is sampled before the first `get`, so batches are not taken from the small memory of the warm-up.
+    `
+    prefetcher = BatchPrefetcher(memory, batch_size=128, lock=memory_lock)
+    indices, batch, weights = prefetcher.get()
+    prefetcher.stall_count, prefetcher.stall_time
+    prefetcher.stop()
+    `
+"""
+import threading
+import time
+import numpy as np
+
+
+class BatchPrefetcher:
+    """
+    Double-buffered background sampling of a `ReplayMemory` or `PrioritizedReplayMemory`.
+    The memory must only be written under `lock` while the prefetcher runs.
+    """
+    def __init__(self, memory, batch_size, lock, prioritized=False):
+        """
+        :param memory: replay memory, with its arrays allocated
+        :param batch_size: number of samples per batch, fewer while the memory is smaller
+        :param lock: lock guarding every write to the memory and its priorities
+        :param prioritized: whether the memory is a `PrioritizedReplayMemory`, for importance-sampling weights
+        """
+        self.memory = memory
+        self.batch_size = batch_size
+        self.lock = lock
+        self.prioritized = prioritized
+
+        state_count = memory.states.shape[1]
+        self.buffers = [
+            {
+                "indices": np.zeros(batch_size, dtype=np.int64),
+                "states": np.zeros((batch_size, state_count), dtype=np.float32),
+                "actions": np.zeros(batch_size, dtype=np.int64),
+                "rewards": np.zeros(batch_size, dtype=np.float32),
+                "next_states": np.zeros((batch_size, state_count), dtype=np.float32),
+                "dones": np.zeros(batch_size, dtype=bool),
+                "weights": np.ones(batch_size, dtype=np.float32),
+                "count": 0,
+            }
+            for _ in range(2)
+        ]
+        # a buffer is either ready to be read by `get` or free to be filled by the thread
+        self.ready = [threading.Event(), threading.Event()]
+        self.free = [threading.Event(), threading.Event()]
+        for event in self.free:
+            event.set()
+        self.current = 0
+        self.held = None
+        self.started = threading.Event()
+        # exception of the background thread, raised again by `get`
+        self.error = None
+
+        self.batch_count = 0
+        self.stall_count = 0
+        self.stall_time = 0.0
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def fill(self, buffer):
+        """
+        Sample a batch into a buffer
+        :param buffer: one of `buffers`
+        :return: None
+        """
+        memory = self.memory
+        with self.lock:
+            indices = memory.sample_indices(self.batch_size)
+            count = len(indices)
+            buffer["indices"][:count] = indices
+            np.take(memory.states, indices, axis=0, out=buffer["states"][:count])
+            np.take(memory.actions, indices, out=buffer["actions"][:count])
+            np.take(memory.rewards, indices, out=buffer["rewards"][:count])
+            np.take(memory.next_states, indices, axis=0, out=buffer["next_states"][:count])
+            np.take(memory.dones, indices, out=buffer["dones"][:count])
+            if self.prioritized:
+                buffer["weights"][:count] = memory.importance_weights(indices)
+        buffer["count"] = count
+
+    def run(self):
+        """
+        Background thread: from the first `get` on, fill the buffers in turn as soon as they are free
+        :return: None
+        """
+        index = 0
+        try:
+            while not self.stopped.is_set():
+                if not self.started.wait(timeout=0.1) or not self.free[index].wait(timeout=0.1):
+                    continue
+                if len(self.memory) == 0:
+                    time.sleep(0.001)
+                    continue
+                self.free[index].clear()
+                self.fill(self.buffers[index])
+                self.ready[index].set()
+                index = 1 - index
+        except Exception as error:
+            # wake up a waiting `get`, which raises the error
+            self.error = error
+            for event in self.ready:
+                event.set()
+
+    def get(self):
+        """
+        Take the next prepared batch, waiting for it if it is not ready yet (a stall).
+        The arrays are views of a buffer which stays valid until the next call.
+        An exception of the background thread is raised here.
+        :return: (indices, (states, actions, rewards, next_states, dones), weights), weights are None
+        without prioritized replay
+        """
+        self.started.set()
+        # the batch of the previous call can be refilled now
+        if self.held is not None:
+            self.free[self.held].set()
+
+        index = self.current
+        if not self.ready[index].is_set():
+            self.stall_count += 1
+            start = time.perf_counter()
+            self.ready[index].wait()
+            self.stall_time += time.perf_counter() - start
+        if self.error is not None:
+            raise self.error
+        self.ready[index].clear()
+        self.held, self.current = index, 1 - index
+        self.batch_count += 1
+
+        # a batch prepared while the memory was smaller than a batch is sampled again from the grown memory
+        buffer = self.buffers[index]
+        if buffer["count"] < min(self.batch_size, len(self.memory)):
+            self.fill(buffer)
+        count = buffer["count"]
+        batch = (
+            buffer["states"][:count],
+            buffer["actions"][:count],
+            buffer["rewards"][:count],
+            buffer["next_states"][:count],
+            buffer["dones"][:count],
+        )
+        weights = buffer["weights"][:count] if self.prioritized else None
+        return buffer["indices"][:count], batch, weights
+
+    def stop(self):
+        """
+        Stop the background thread
+        :return: None
+        """
+        self.stopped.set()
+        self.thread.join()
@@ -1,20 +1,51 @@
 """
 This module offers a neural network implementation utilising the Keras library.
 Please note that the `GaussianNoise` layer is for noisy network design.
+
+Acting does not go through Keras: a NumPy copy of the weights runs the forward pass of single states and batches
+in microseconds, with the `GaussianNoise` layer off as in inference. The copy is refreshed every `_refresh_every` fits.
+
+Training can also skip `model.fit`: `compile_train_step` traces the forward passes, target computation, loss and
+optimizer updates of a whole batch into one TensorFlow graph, with the same loss and minibatches as `_fit`.
+    `
+    net.compile_train_step(gamma, target_net=None, double_dqn=False)
+    td_errors = net._train(states, actions, rewards, next_states, dones)
+    net.step_latency()
+    `
 """
+import time
+import numpy as np
+import tensorflow as tf
 from keras.models import Sequential
 from keras.layers import Dense, GaussianNoise
 
+from algo.dqn_pygame_pong.numpy_policy import forward
+
 
 class DQN:
     """
     This class uses Keras to create a neural network with an input layer, two hidden layers with a noise layer in between, and an output layer.
     """
-    def __init__(self, _state_count, _action_count):
+    def __init__(self, _state_count, _action_count, _refresh_every=1):
+        """
+        :param _state_count: size of a state
+        :param _action_count: number of actions
+        :param _refresh_every: number of fits between refreshes of the NumPy weights used for acting
+        """
         self.state_count = _state_count
         self.action_count = _action_count
         self.model = self.compile_net()
 
+        self.refresh_every = _refresh_every
+        self.fit_count = 0
+        self.numpy_layers = []
+        self.refresh_numpy()
+
+        # compiled training step, see `compile_train_step`
+        self.train_function = None
+        self.train_time = 0.0
+        self.train_count = 0
+
     def compile_net(self):
         """
         Compile the network
@@ -28,16 +59,160 @@ class DQN:
         model.compile(loss="mse", optimizer="adam")
         return model
 
-    def _fit(self, _x, _y, _epoch=1, _verbose=0):
+    def _fit(self, _x, _y, _epoch=1, _verbose=0, _sample_weight=None):
         """
         Train the network
         :param _x: input
         :param _y: output
         :param _epoch:
         :param _verbose:
+        :param _sample_weight: weight of each sample in the loss, e.g. importance-sampling weights
+        :return: None
+        """
+        self.model.fit(
+            _x,
+            _y,
+            batch_size=64,
+            epochs=_epoch,
+            verbose=_verbose,
+            sample_weight=_sample_weight,
+        )
+        self.after_fit()
+
+    def after_fit(self):
+        """
+        Count a fit and refresh the NumPy weights every `refresh_every` fits
+        :return: None
+        """
+        self.fit_count += 1
+        if self.fit_count % self.refresh_every == 0:
+            self.refresh_numpy()
+
+    def compile_train_step(self, _gamma, _target_net=None, _double_dqn=False, _batch_size=64):
+        """
+        Trace the training step of a batch into one TensorFlow function: predict the Q-values, compute the
+        Q-learning targets, then take one optimizer step per minibatch of `_batch_size` shuffled samples
+        on the mse loss, the same as `_fit` on the targets of `Agent.compute_targets`
+        :param _gamma: discount factor
+        :param _target_net: DQN giving the next state values, this network if None
+        :param _double_dqn: select the next action with this network and evaluate it with the target network
+        :param _batch_size: minibatch size, the same as `_fit`
+        :return: None
+        """
+        model = self.model
+        target_model = model if _target_net is None else _target_net.model
+        optimizer = model.optimizer
+        # optimizer slots are created here, as a traced function cannot create variables inside a loop
+        optimizer.build(model.trainable_variables)
+
+        @tf.function(
+            input_signature=[
+                tf.TensorSpec([None, self.state_count], tf.float32),
+                tf.TensorSpec([None], tf.int32),
+                tf.TensorSpec([None], tf.float32),
+                tf.TensorSpec([None, self.state_count], tf.float32),
+                tf.TensorSpec([None], tf.float32),
+                tf.TensorSpec([None], tf.float32),
+            ]
+        )
+        def train_function(states, actions, rewards, next_states, dones, sample_weight):
+            count = tf.shape(actions)[0]
+            rows = tf.range(count)
+            taken = tf.stack([rows, actions], axis=1)
+
+            # targets, a terminal state has no expected future rewards
+            policy_q = model(states, training=False)
+            next_target_q = target_model(next_states, training=False)
+            if _double_dqn:
+                next_actions = tf.argmax(
+                    model(next_states, training=False), axis=1, output_type=tf.int32
+                )
+                next_q = tf.gather_nd(next_target_q, tf.stack([rows, next_actions], axis=1))
+            else:
+                next_q = tf.reduce_max(next_target_q, axis=1)
+            targets = rewards + _gamma * (1.0 - dones) * next_q
+            td_errors = targets - tf.gather_nd(policy_q, taken)
+            y = tf.tensor_scatter_nd_update(policy_q, taken, targets)
+
+            order = tf.random.shuffle(rows)
+            for start in tf.range(0, count, _batch_size):
+                minibatch = order[start : start + _batch_size]
+                with tf.GradientTape() as tape:
+                    prediction = model(tf.gather(states, minibatch), training=True)
+                    losses = tf.reduce_mean(
+                        tf.square(tf.gather(y, minibatch) - prediction), axis=1
+                    )
+                    loss = tf.reduce_sum(losses * tf.gather(sample_weight, minibatch)) / tf.cast(
+                        tf.size(minibatch), tf.float32
+                    )
+                gradients = tape.gradient(loss, model.trainable_variables)
+                optimizer.apply_gradients(zip(gradients, model.trainable_variables))
+            return td_errors
+
+        self.train_function = train_function
+
+    def _train(self, states, actions, rewards, next_states, dones, sample_weight=None):
+        """
+        Train the network on a batch with the compiled step, see `compile_train_step`
+        :param states: states, shape (batch, state_count)
+        :param actions: actions, shape (batch,)
+        :param rewards: rewards, shape (batch,)
+        :param next_states: next states, shape (batch, state_count)
+        :param dones: terminal mask, shape (batch,)
+        :param sample_weight: weight of each sample in the loss, all ones if not given
+        :return: TD errors of the batch
+        """
+        if self.train_function is None:
+            raise ValueError("The train step should be compiled with compile_train_step first")
+        if sample_weight is None:
+            sample_weight = np.ones(len(actions), dtype=np.float32)
+
+        start = time.perf_counter()
+        td_errors = self.train_function(
+            np.asarray(states, dtype=np.float32),
+            np.asarray(actions, dtype=np.int32),
+            np.asarray(rewards, dtype=np.float32),
+            np.asarray(next_states, dtype=np.float32),
+            np.asarray(dones, dtype=np.float32),
+            np.asarray(sample_weight, dtype=np.float32),
+        ).numpy()
+        self.train_time += time.perf_counter() - start
+        self.train_count += 1
+
+        self.after_fit()
+        return td_errors
+
+    def step_latency(self):
+        """
+        :return: mean seconds per compiled training step, the first step includes tracing
+        """
+        return self.train_time / max(self.train_count, 1)
+
+    def refresh_numpy(self):
+        """
+        Copy the weights of the Dense layers for the NumPy forward pass, other layers are skipped
+        as `GaussianNoise` does nothing at inference
         :return: None
         """
-        self.model.fit(_x, _y, batch_size=64, epochs=_epoch, verbose=_verbose)
+        numpy_layers = []
+        for layer in self.model.layers:
+            if not isinstance(layer, Dense):
+                continue
+            activation = layer.activation.__name__
+            if activation not in ("relu", "linear"):
+                raise ValueError("The activation should be relu or linear")
+            kernel, bias = layer.get_weights()
+            numpy_layers.append((kernel, bias, activation))
+        self.numpy_layers = numpy_layers
+
+    def sync_from(self, _net):
+        """
+        Copy the weights of another network, e.g. from the policy network to the target network
+        :param _net: DQN of the same shape
+        :return: None
+        """
+        self.model.set_weights(_net.model.get_weights())
+        self.refresh_numpy()
 
     def _predict(self, x):
         """
@@ -47,6 +222,14 @@ class DQN:
         """
         return self.model.predict(x)
 
+    def _predict_numpy(self, x):
+        """
+        Use the NumPy copy of the network to predict one batch, for acting
+        :param x: states, shape (batch, state_count)
+        :return: predicted result, weights are as of the last refresh
+        """
+        return forward(self.numpy_layers, x)
+
     def _predict_single(self, _x):
         """
         Use the network to predict single input
@@ -54,5 +237,5 @@ class DQN:
         :return: predicted result
         """
         x = _x.reshape(1, self.state_count)
-        x = self._predict(x).flatten()
+        x = self._predict_numpy(x).flatten()
         return x
@@ -0,0 +1,92 @@
+"""
+This module contains the NumPy forward pass of the DQN, without Keras or TensorFlow, so it can be used
+by the acting processes of `actor_learner` as well as by `DQN` itself.
+A network is a list of (kernel, bias, activation) layers. For sharing between processes it is flattened
+into one float32 array, with the shapes and activations kept on the side.
+    `
+    q_values = forward(net.numpy_layers, states)
+    actions = epsilon_greedy(net.numpy_layers, states, apex_epsilons(len(states)), np_random, 3)
+    flat, shapes, activations = flatten_layers(net.numpy_layers)
+    layers = unflatten_layers(flat, shapes, activations)
+    `
+"""
+import numpy as np
+
+
+def forward(layers, x):
+    """
+    :param layers: list of (kernel, bias, activation), activation is "relu" or "linear"
+    :param x: states, shape (batch, state_count)
+    :return: Q-values, shape (batch, action_count)
+    """
+    x = np.asarray(x, dtype=np.float32)
+    for kernel, bias, activation in layers:
+        x = x @ kernel + bias
+        if activation == "relu":
+            np.maximum(x, 0.0, out=x)
+    return x
+
+
+def epsilon_greedy(layers, states, epsilons, np_random, num_action):
+    """
+    Batched epsilon-greedy action selection with one forward pass over the greedy states
+    :param layers: list of (kernel, bias, activation), random actions only if None
+    :param states: states, shape (batch, state_count)
+    :param epsilons: exploration rate, one for every state or a single one for all
+    :param np_random: numpy random generator
+    :param num_action: number of actions
+    :return: actions, shape (batch,)
+    """
+    count = len(states)
+    actions = np_random.integers(0, num_action, count)
+    if layers is None:
+        return actions
+    greedy = np_random.random(count) >= epsilons
+    if greedy.any():
+        actions[greedy] = np.argmax(forward(layers, states[greedy]), axis=1)
+    return actions
+
+
+def apex_epsilons(count, base=0.4, alpha=7.0):
+    """
+    Fixed exploration rates spread over many environments as in Ape-X, base^(1 + alpha * i / (count - 1))
+    :param count: number of environments
+    :param base: exploration rate of the first environment
+    :param alpha: spread of the rates, the last environment gets base^(1 + alpha)
+    :return: exploration rate of every environment
+    """
+    if count == 1:
+        return np.asarray([base])
+    return base ** (1.0 + alpha * np.arange(count) / (count - 1))
+
+
+def flatten_layers(layers):
+    """
+    :param layers: list of (kernel, bias, activation)
+    :return: (flat float32 weights, shapes of the kernels, activations)
+    """
+    flat = np.concatenate(
+        [np.concatenate([kernel.ravel(), bias.ravel()]) for kernel, bias, _ in layers]
+    ).astype(np.float32)
+    shapes = [kernel.shape for kernel, _, _ in layers]
+    activations = [activation for _, _, activation in layers]
+    return flat, shapes, activations
+
+
+def unflatten_layers(flat, shapes, activations):
+    """
+    Inverse of `flatten_layers`, the arrays are copies of `flat`
+    :param flat: flat float32 weights
+    :param shapes: shapes of the kernels
+    :param activations: activations
+    :return: list of (kernel, bias, activation)
+    """
+    layers, offset = [], 0
+    for shape, activation in zip(shapes, activations):
+        size = shape[0] * shape[1]
+        kernel = np.array(flat[offset : offset + size]).reshape(shape)
+        offset += size
+        bias = np.array(flat[offset : offset + shape[1]])
+        offset += shape[1]
+        layers.append((kernel, bias, activation))
+    return layers
@@ -0,0 +1,169 @@
+"""
+This module contain prioritized experience replay: experiences are sampled in proportion to their TD error,
+so the rare frames in which the ball is hit or missed are replayed more often than the many uneventful ones.
+Priorities are kept in a sum-tree, so a whole batch is sampled and updated in O(batch size * log(capacity))
+with one array operation per tree level.
+    `
+    memory = PrioritizedReplayMemory(memory_size=100000, state_count=5)
+    memory.memorise((state, action, reward, next_state))
+    indices = memory.sample_indices(128)
+    states, actions, rewards, next_states, dones = memory.gather(indices)
+    weights = memory.importance_weights(indices)
+    memory.update_priorities(indices, td_errors)
+    `
+"""
+import numpy as np
+
+from algo.dqn_pygame_pong.replay_memory import ReplayMemory
+
+
+class SumTree:
+    """
+    Binary tree in one array, every node holds the sum of its two children.
+    The root is at index 1 and leaf `i` is at index `num_leaves + i`.
+    """
+
+    def __init__(self, capacity):
+        """
+        :param capacity: number of leaves, rounded up to a power of two so every leaf has the same depth
+        """
+        self.depth = max(int(np.ceil(np.log2(capacity))), 0)
+        self.num_leaves = 2 ** self.depth
+        self.tree = np.zeros(2 * self.num_leaves)
+
+    def total(self):
+        """
+        :return: sum of every leaf
+        """
+        return self.tree[1]
+
+    def get(self, indices):
+        """
+        :param indices: leaf indices
+        :return: leaf values
+        """
+        return self.tree[self.num_leaves + np.asarray(indices)]
+
+    def update(self, indices, values):
+        """
+        Set leaf values and recompute their ancestors, one tree level at a time
+        :param indices: leaf indices, the last value is kept for duplicate indices
+        :param values: new leaf values
+        :return: None
+        """
+        nodes = self.num_leaves + np.asarray(indices)
+        self.tree[nodes] = values
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values):
+        """
+        Prefix-sum search of every value at once
+        :param values: array of values in [0, total)
+        :return: leaf indices whose cumulative range contains each value
+        """
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            go_right = values >= self.tree[left]
+            values -= np.where(go_right, self.tree[left], 0.0)
+            nodes = left + go_right
+        return nodes - self.num_leaves
+
+
+class PrioritizedReplayMemory(ReplayMemory):
+    """
+    Proportional prioritized replay: experience `i` is sampled with probability p_i^alpha / sum_k p_k^alpha,
+    where p_i is its last absolute TD error. New experiences get the largest priority seen so far,
+    so each is replayed at least once.
+    """
+    def __init__(
+        self,
+        memory_size,
+        state_count=None,
+        seed=None,
+        alpha=0.6,
+        beta_start=0.4,
+        beta_frames=100000,
+        epsilon=1e-6,
+    ):
+        """
+        :param memory_size: capacity
+        :param state_count: size of a state, taken from the first experience if not given
+        :param seed: random seed of sampling
+        :param alpha: how much prioritization is used, 0 is uniform sampling
+        :param beta_start: initial importance-sampling exponent, annealed linearly to 1
+        :param beta_frames: number of memorised experiences over which beta reaches 1
+        :param epsilon: added to every priority so every experience can still be sampled
+        """
+        super().__init__(memory_size, state_count, seed)
+        self.alpha = alpha
+        self.beta_start = beta_start
+        self.beta_frames = beta_frames
+        self.epsilon = epsilon
+        self.sum_tree = SumTree(memory_size)
+        self.max_priority = 1.0
+        self.num_memorised = 0
+
+    def beta(self):
+        """
+        :return: current importance-sampling exponent
+        """
+        progress = min(self.num_memorised / self.beta_frames, 1.0)
+        return self.beta_start + (1.0 - self.beta_start) * progress
+
+    def memorise(self, sample):
+        """
+        :param sample: (state, action, reward, next_state), next_state is None for a terminal state
+        :return: index of the sample
+        """
+        index = super().memorise(sample)
+        self.sum_tree.update([index], [self.max_priority ** self.alpha])
+        self.num_memorised += 1
+        return index
+
+    def memorise_batch(self, states, actions, rewards, next_states, dones):
+        """
+        Memorise many experiences at once, see `ReplayMemory.memorise_batch`
+        :return: indices of the samples
+        """
+        indices = super().memorise_batch(states, actions, rewards, next_states, dones)
+        self.sum_tree.update(indices, np.full(len(indices), self.max_priority ** self.alpha))
+        self.num_memorised += len(actions)
+        return indices
+
+    def sample_indices(self, _batch_size):
+        """
+        Stratified sampling: the total priority is split into `_batch_size` equal segments
+        and one experience is drawn from each
+        :param _batch_size:
+        :return: indices of up to `_batch_size` samples, duplicates are possible
+        """
+        batch_size = min(_batch_size, self.size)
+        segment = self.sum_tree.total() / batch_size
+        values = (np.arange(batch_size) + self.np_random.random(batch_size)) * segment
+        # rounding can reach the empty leaves past the end of the memory
+        return np.minimum(self.sum_tree.find(values), self.size - 1)
+
+    def importance_weights(self, indices):
+        """
+        Importance-sampling weights (N * P(i))^-beta, normalised by the largest weight of the batch
+        :param indices: indices of samples
+        :return: weights in (0, 1]
+        """
+        probabilities = self.sum_tree.get(indices) / self.sum_tree.total()
+        weights = (self.size * probabilities) ** -self.beta()
+        return (weights / weights.max()).astype(np.float32)
+
+    def update_priorities(self, indices, td_errors):
+        """
+        Feed the TD errors of a trained batch back as the new priorities
+        :param indices: indices of samples
+        :param td_errors: TD errors of the samples
+        :return: None
+        """
+        priorities = np.abs(td_errors) + self.epsilon
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.sum_tree.update(indices, priorities ** self.alpha)
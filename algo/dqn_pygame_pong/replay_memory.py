@@ -1,28 +1,127 @@
 """
-This module contain memory for implementation of experience replay
+This module contain memory for implementation of experience replay.
+Experiences are kept in a ring buffer of preallocated typed arrays, so the capacity can go into the millions
+without Python object overhead, and a batch is sampled as arrays ready to be fed to the network.
+    `
+    memory = ReplayMemory(memory_size=1000000, state_count=5)
+    memory.memorise((state, action, reward, next_state))  # next_state is None for a terminal state
+    states, actions, rewards, next_states, dones = memory.sample(128)
+    `
 """
-import collections
-import random
+import numpy as np
 
 
 class ReplayMemory:
     """
-    A simple memory that automatically delete old records if reach capacity
+    A simple memory that automatically overwrite old records if reach capacity
     """
-    def __init__(self, memory_size):
-        self.memory = collections.deque(maxlen=memory_size)
+    def __init__(self, memory_size, state_count=None, seed=None):
+        """
+        :param memory_size: capacity
+        :param state_count: size of a state, taken from the first experience if not given
+        :param seed: random seed of sampling
+        """
+        self.memory_size = memory_size
+        self.position = 0
+        self.size = 0
+        self.np_random = np.random.default_rng(seed)
+
+        self.states = None
+        if state_count is not None:
+            self.allocate(state_count)
+
+    def __len__(self):
+        return self.size
+
+    def allocate(self, state_count):
+        """
+        Allocate the arrays of the whole capacity
+        :param state_count: size of a state
+        :return: None
+        """
+        self.states = np.zeros((self.memory_size, state_count), dtype=np.float32)
+        self.actions = np.zeros(self.memory_size, dtype=np.int64)
+        self.rewards = np.zeros(self.memory_size, dtype=np.float32)
+        self.next_states = np.zeros((self.memory_size, state_count), dtype=np.float32)
+        self.dones = np.zeros(self.memory_size, dtype=bool)
 
     def memorise(self, sample):
         """
-        :param sample:
-        :return:
+        :param sample: (state, action, reward, next_state), next_state is None for a terminal state
+        :return: index of the sample
+        """
+        state, action, reward, next_state = sample
+        if self.states is None:
+            self.allocate(len(state))
+
+        index = self.position
+        self.states[index] = state
+        self.actions[index] = action
+        self.rewards[index] = reward
+        self.dones[index] = next_state is None
+        self.next_states[index] = 0.0 if next_state is None else next_state
+
+        self.position = (self.position + 1) % self.memory_size
+        self.size = min(self.size + 1, self.memory_size)
+        return index
+
+    def memorise_batch(self, states, actions, rewards, next_states, dones):
+        """
+        Memorise many experiences at once, e.g. one step of every game of a `VectorPong`
+        :param states: array of shape (n, state_count)
+        :param actions: array of shape (n,)
+        :param rewards: array of shape (n,)
+        :param next_states: array of shape (n, state_count), ignored where done
+        :param dones: boolean array of shape (n,)
+        :return: indices of the samples
+        """
+        if self.states is None:
+            self.allocate(np.shape(states)[1])
+
+        count = len(actions)
+        indices = (self.position + np.arange(count)) % self.memory_size
+        if count > self.memory_size:
+            # only the most recent experiences fit
+            indices, count = indices[-self.memory_size :], self.memory_size
+            states, actions, rewards, next_states, dones = (
+                np.asarray(array)[-count:]
+                for array in (states, actions, rewards, next_states, dones)
+            )
+
+        self.states[indices] = states
+        self.actions[indices] = actions
+        self.rewards[indices] = rewards
+        self.dones[indices] = dones
+        self.next_states[indices] = np.where(np.reshape(dones, (-1, 1)), 0.0, next_states)
+
+        self.position = (indices[-1] + 1) % self.memory_size
+        self.size = min(self.size + count, self.memory_size)
+        return indices
+
+    def sample_indices(self, _batch_size):
+        """
+        :param _batch_size:
+        :return: indices of up to `_batch_size` distinct samples, uniformly at random
+        """
+        batch_size = min(_batch_size, self.size)
+        return self.np_random.choice(self.size, batch_size, replace=False)
+
+    def gather(self, indices):
+        """
+        :param indices: indices of samples
+        :return: (states, actions, rewards, next_states, dones) arrays
         """
-        self.memory.append(sample)
+        return (
+            self.states[indices],
+            self.actions[indices],
+            self.rewards[indices],
+            self.next_states[indices],
+            self.dones[indices],
+        )
 
     def sample(self, _batch_size):
         """
         :param _batch_size:
-        :return:
+        :return: (states, actions, rewards, next_states, dones) arrays of up to `_batch_size` samples
         """
-        batch_size = min(_batch_size, len(self.memory))
-        return random.sample(self.memory, batch_size)
+        return self.gather(self.sample_indices(_batch_size))
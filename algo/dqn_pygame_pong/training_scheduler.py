@@ -0,0 +1,118 @@
+"""
+This module decouples acting from learning: the scheduler is told about every environment frame and decides when
+the agent trains and for how many gradient steps, and when the target network is synced.
+The cadence is set either by a train frequency and gradient steps per update, or by a replay ratio,
+the number of replayed samples per environment frame.
+    `
+    scheduler = TrainingScheduler(_agent, train_frequency=4, warmup_size=750)
+    for frame in range(MAXIMUM_FRAME_COUNT):
+        ...
+        _agent.record_experience((state, action, score, next_state))
+        scheduler.step()
+    scheduler.report()
+    `
+"""
+import time
+
+from algo.dqn_pygame_pong.agent import REPLAY_BATCH_SIZE
+
+
+class TrainingScheduler:
+    """
+    Training cadence of an `Agent`, with its own throughput counters
+    """
+    def __init__(
+        self,
+        agent,
+        train_frequency=1,
+        gradient_steps=1,
+        replay_ratio=None,
+        warmup_size=0,
+        target_sync_interval=None,
+    ):
+        """
+        :param agent: `Agent` to train
+        :param train_frequency: number of environment frames between updates
+        :param gradient_steps: number of training steps per update, ignored if `replay_ratio` is given
+        :param replay_ratio: replayed samples per environment frame, e.g. `REPLAY_BATCH_SIZE` / 4 trains one batch
+        every 4 frames, fractional steps are carried over to the next update
+        :param warmup_size: number of experiences in memory before the first update
+        :param target_sync_interval: number of environment frames between target network syncs,
+        the scheduler then owns the syncing, see `Agent.create_target_net`
+        """
+        if target_sync_interval:
+            agent.create_target_net()
+        self.agent = agent
+        self.train_frequency = train_frequency
+        self.gradient_steps = gradient_steps
+        self.replay_ratio = replay_ratio
+        self.warmup_size = warmup_size
+        self.target_sync_interval = target_sync_interval
+
+        self.step_credit = 0.0
+        self.frame_count = 0
+        self.update_count = 0
+        self.gradient_step_count = 0
+        self.train_time = 0.0
+        self.start_time = None
+
+    def steps_per_update(self):
+        """
+        :return: number of training steps of the next update
+        """
+        if self.replay_ratio is None:
+            return self.gradient_steps
+        self.step_credit += self.replay_ratio * self.train_frequency / REPLAY_BATCH_SIZE
+        steps = int(self.step_credit)
+        self.step_credit -= steps
+        return steps
+
+    def step(self, frames=1):
+        """
+        Count environment frames and train the agent for every update which is due
+        :param frames: number of new frames, more than one when experiences arrive in batches
+        :return: number of training steps taken
+        """
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+        previous, self.frame_count = self.frame_count, self.frame_count + frames
+
+        if self.target_sync_interval and (
+            self.frame_count // self.target_sync_interval
+            > previous // self.target_sync_interval
+        ):
+            self.agent.sync_target()
+
+        if len(self.agent.experience_memory) < max(self.warmup_size, 1):
+            return 0
+        updates = self.frame_count // self.train_frequency - previous // self.train_frequency
+        if updates == 0:
+            return 0
+
+        steps = sum(self.steps_per_update() for _ in range(updates))
+        start = time.perf_counter()
+        for _ in range(steps):
+            self.agent.train()
+        self.train_time += time.perf_counter() - start
+        self.update_count += updates
+        self.gradient_step_count += steps
+        return steps
+
+    def report(self):
+        """
+        :return: dictionary of frames, training steps, replay ratio achieved and throughput
+        """
+        elapsed = 0.0 if self.start_time is None else time.perf_counter() - self.start_time
+        return {
+            "frames": self.frame_count,
+            "updates": self.update_count,
+            "gradient_steps": self.gradient_step_count,
+            "replay_ratio": self.gradient_step_count
+            * REPLAY_BATCH_SIZE
+            / max(self.frame_count, 1),
+            "frames_per_second": self.frame_count / elapsed if elapsed else 0.0,
+            "gradient_steps_per_second": self.gradient_step_count / self.train_time
+            if self.train_time
+            else 0.0,
+            "train_time_share": self.train_time / elapsed if elapsed else 0.0,
+        }
@@ -0,0 +1,352 @@
+"""
+This module contains model-based Q-learning planners: Dyna-Q and prioritized sweeping.
+As `CabEnv` is deterministic, every real transition is remembered in a model table and replayed by many planning
+updates, so far fewer environment episodes are needed than with plain `q_learning`.
+    `
+    from algo.dyna_q.dyna_q import dyna_q, prioritized_sweeping
+    q_table, training_info = dyna_q(env, penalty, max_eps, alpha, gamma, epsilon_start, planning_steps=20)
+    q_table, training_info = prioritized_sweeping(env, penalty, max_eps, alpha, gamma, epsilon_start)
+    `
+"""
+import heapq
+import random
+import numpy as np
+
+from algo.basic_q_learning.q_learning import reward_dtype
+from algo.basic_q_learning.training_metrics import (
+    Q_LEARNING_COLUMNS,
+    TrainingMetrics,
+    print_progress,
+)
+from algo.e_greedy.epsilon_greedy import get_epsilon
+
+
+class DeterministicModel:
+    """
+    Learned model of a deterministic environment: the last observed outcome of every state-action,
+    with the list of observed state-actions and the predecessors of every state
+    """
+
+    def __init__(self, num_state, num_action):
+        self.num_action = num_action
+        self.next_state = np.full(num_state * num_action, -1, dtype=np.int64)
+        self.reward = np.zeros(num_state * num_action)
+        self.done = np.zeros(num_state * num_action, dtype=bool)
+
+        # flat indices of observed state-actions, for uniform sampling
+        self.observed = np.zeros(num_state * num_action, dtype=np.int64)
+        self.num_observed = 0
+
+        # predecessor index: state -> flat indices of the state-actions leading to it
+        self.predecessors = {}
+
+    def learn(self, state, action, reward, new_state, termination):
+        """
+        Remember the outcome of a real transition
+        :return: flat index of the state-action
+        """
+        index = state * self.num_action + action
+        if self.next_state[index] < 0:
+            self.observed[self.num_observed] = index
+            self.num_observed += 1
+        elif self.next_state[index] != new_state:
+            self.predecessors.get(self.next_state[index], set()).discard(index)
+        self.next_state[index] = new_state
+        self.reward[index] = reward
+        self.done[index] = termination
+        self.predecessors.setdefault(new_state, set()).add(index)
+        return index
+
+    def sample(self, count, rng):
+        """
+        :param count: number of state-actions
+        :param rng: numpy random generator
+        :return: flat indices of observed state-actions, sampled uniformly with replacement
+        """
+        return self.observed[rng.integers(0, self.num_observed, count)]
+
+
+def td_target(q_table, model, index, gamma):
+    """
+    :return: TD target of an observed state-action from the model, a terminal state has no expected future rewards
+    """
+    if model.done[index]:
+        return model.reward[index]
+    return model.reward[index] + gamma * q_table[model.next_state[index]].max()
+
+
+def plan_dyna(q_table, model, alpha, gamma, planning_steps, rng):
+    """
+    Dyna-Q planning: replay `planning_steps` uniformly sampled state-actions from the model in one batch.
+    Duplicate state-actions within the batch are updated once with the mean of their TD errors.
+    :return: number of planning updates
+    """
+    if model.num_observed == 0 or planning_steps == 0:
+        return 0
+    indices = model.sample(planning_steps, rng)
+    next_values = np.max(q_table[model.next_state[indices]], axis=1)
+    targets = model.reward[indices] + gamma * np.where(
+        model.done[indices], 0.0, next_values
+    )
+    q_flat = q_table.reshape(-1)
+    td_errors = targets - q_flat[indices]
+    unique_indices, inverse = np.unique(indices, return_inverse=True)
+    q_flat[unique_indices] += alpha * (
+        np.bincount(inverse, weights=td_errors) / np.bincount(inverse)
+    )
+    return planning_steps
+
+
+def plan_prioritized(q_table, model, queue, queued, alpha, gamma, planning_steps, theta):
+    """
+    Prioritized sweeping: update the state-actions with the largest TD errors first and push
+    the predecessors of every updated state back to the queue.
+    :param queue: heap of (-priority, flat index)
+    :param queued: flat index -> priority in the queue, older heap entries of the same index are stale
+    :return: number of planning updates
+    """
+    q_flat = q_table.reshape(-1)
+    updates = 0
+    while queue and updates < planning_steps:
+        negative_priority, index = heapq.heappop(queue)
+        if queued.get(index) != -negative_priority:
+            continue  # stale entry
+        del queued[index]
+
+        q_flat[index] += alpha * (td_target(q_table, model, index, gamma) - q_flat[index])
+        updates += 1
+
+        # every predecessor leads to the updated state, so they share its maximum Q-value
+        state = index // model.num_action
+        predecessors = model.predecessors.get(state)
+        if not predecessors:
+            continue
+        predecessors = np.fromiter(predecessors, dtype=np.int64, count=len(predecessors))
+        targets = model.reward[predecessors] + gamma * np.where(
+            model.done[predecessors], 0.0, q_table[state].max()
+        )
+        priorities = np.abs(targets - q_flat[predecessors])
+        for predecessor, priority in zip(
+            predecessors[priorities > theta].tolist(),
+            priorities[priorities > theta].tolist(),
+        ):
+            push(queue, queued, predecessor, priority, theta)
+    return updates
+
+
+def push(queue, queued, index, priority, theta):
+    """
+    Push a state-action to the queue if its priority is above `theta` and above its queued priority
+    :return: None
+    """
+    if priority > theta and priority > queued.get(index, 0.0):
+        queued[index] = priority
+        heapq.heappush(queue, (-priority, index))
+
+
+def planning_q_learning(
+    env,
+    penalty,
+    max_eps,
+    alpha,
+    gamma,
+    epsilon_start,
+    strategy="linear",
+    epsilon_decay=None,
+    planner="dyna",
+    planning_steps=10,
+    theta=1e-4,
+    q_table=None,
+    progress=print_progress,
+    progress_every=100,
+    early_stopping=None,
+    seed=None,
+):
+    """
+    Q-learning with model-based planning after every real step
+    :param env: environment
+    :param penalty: reward value counted as a penalty
+    :param max_eps: number of episodes
+    :param alpha: learning rate
+    :param gamma: discount factor
+    :param epsilon_start: starting epsilon
+    :param strategy: epsilon strategy, see `get_epsilon`
+    :param epsilon_decay: epsilon decay rate for exponential strategy
+    :param planner: "dyna" for Dyna-Q or "prioritized" for prioritized sweeping
+    :param planning_steps: planning budget, number of planning updates per real step
+    :param theta: priority threshold of prioritized sweeping
+    :param q_table: initial Q-table to warm-start from, zeros if not given
+    :param progress: callback `progress(episode, max_eps)` or None
+    :param progress_every: number of episodes between progress callbacks
+    :param early_stopping: `EarlyStopping` criteria, all `max_eps` episodes are run if not given
+    :param seed: random seed of the Dyna-Q model sampling
+    :return: q_table, training_info in the same format as `q_learning`,
+    with `attrs["planning_updates"]` in addition
+    """
+    if planner not in ("dyna", "prioritized"):
+        raise ValueError("The planner should be dyna or prioritized")
+
+    # initialise the q_table, or warm-start from a given one
+    if q_table is None:
+        q_table = np.zeros([env.observation_space.n, env.action_space.n])
+    else:
+        q_table = np.array(q_table, dtype=np.float64)
+    model = DeterministicModel(*q_table.shape)
+    rng = np.random.default_rng(seed)
+    queue, queued = [], {}
+    planning_updates = 0
+
+    # initialise training information
+    metrics = TrainingMetrics(
+        max_eps, dict(Q_LEARNING_COLUMNS, total_rewards=reward_dtype(env))
+    )
+    stop_reason, stop_episode = "max_eps", max_eps
+    if early_stopping is not None:
+        early_stopping.reset()
+
+    for episode in range(1, max_eps + 1):
+        # reset the environment at the beginning of episode
+        state = env.reset()
+
+        # initialise training info of each episode
+        step_count, penalty_count, total_reward, max_q_delta, sum_q_delta = (
+            0,
+            0,
+            0,
+            0.0,
+            0.0,
+        )
+        termination = False
+
+        # get epsilon of the episode
+        epsilon = get_epsilon(epsilon_start, max_eps, episode, strategy, epsilon_decay)
+
+        # keep updating until get termination signal
+        while not termination:
+            # action selection based on epsilon
+            if random.uniform(0, 1) < epsilon:
+                action = env.action_space.sample()  # Explore action space
+            else:
+                action = np.argmax(q_table[state])  # Exploit learned values
+
+            # gather new state from action and remember it in the model
+            new_state, reward, termination, _ = env.step(action)
+            index = model.learn(state, action, reward, new_state, termination)
+
+            # direct Q-learning update from the real transition
+            td_error = td_target(q_table, model, index, gamma) - q_table[state, action]
+            if planner == "dyna":
+                q_table[state, action] += alpha * td_error
+                planning_updates += plan_dyna(
+                    q_table, model, alpha, gamma, planning_steps, rng
+                )
+            else:
+                # the real transition is updated through the queue by its priority
+                push(queue, queued, index, abs(td_error), theta)
+                planning_updates += plan_prioritized(
+                    q_table, model, queue, queued, alpha, gamma, planning_steps, theta
+                )
+
+            # gather training info
+            q_delta = abs(alpha * td_error)
+            max_q_delta = max(max_q_delta, q_delta)
+            sum_q_delta += q_delta
+            step_count += 1
+            if reward == penalty:
+                penalty_count += 1
+            total_reward += reward
+
+            # assign the new state
+            state = new_state
+
+        metrics.record(
+            episode,
+            num_steps=step_count,
+            num_penalties=penalty_count,
+            total_rewards=total_reward,
+            epsilon=epsilon,
+            max_q_delta=max_q_delta,
+            mean_q_delta=sum_q_delta / step_count,
+        )
+
+        if progress is not None and episode % progress_every == 0:
+            progress(episode, max_eps)
+
+        if early_stopping is not None:
+            reason = early_stopping.check(q_table, max_q_delta, total_reward)
+            if reason is not None:
+                stop_reason, stop_episode = reason, episode
+                break
+
+    print(f"\nTraining finished ({stop_reason} at episode {stop_episode}).\n")
+
+    # gather training information
+    training_info = metrics.to_frame()
+    training_info.attrs["stop_reason"] = stop_reason
+    training_info.attrs["stop_episode"] = stop_episode
+    training_info.attrs["planning_updates"] = planning_updates
+    return q_table, training_info
+
+
+def dyna_q(
+    env,
+    penalty,
+    max_eps,
+    alpha,
+    gamma,
+    epsilon_start,
+    strategy="linear",
+    epsilon_decay=None,
+    planning_steps=10,
+    **kwargs
+):
+    """
+    Dyna-Q, see `planning_q_learning`
+    :return: q_table, training_info
+    """
+    return planning_q_learning(
+        env,
+        penalty,
+        max_eps,
+        alpha,
+        gamma,
+        epsilon_start,
+        strategy,
+        epsilon_decay,
+        planner="dyna",
+        planning_steps=planning_steps,
+        **kwargs
+    )
+
+
+def prioritized_sweeping(
+    env,
+    penalty,
+    max_eps,
+    alpha,
+    gamma,
+    epsilon_start,
+    strategy="linear",
+    epsilon_decay=None,
+    planning_steps=10,
+    theta=1e-4,
+    **kwargs
+):
+    """
+    Prioritized sweeping, see `planning_q_learning`
+    :return: q_table, training_info
+    """
+    return planning_q_learning(
+        env,
+        penalty,
+        max_eps,
+        alpha,
+        gamma,
+        epsilon_start,
+        strategy,
+        epsilon_decay,
+        planner="prioritized",
+        planning_steps=planning_steps,
+        theta=theta,
+        **kwargs
+    )
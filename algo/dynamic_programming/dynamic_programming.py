@@ -0,0 +1,174 @@
+"""
+This module contains model-based exact solvers for environments with compiled dynamics tables (such as `CabEnv`).
+As the dynamics are deterministic and fully known, every Bellman backup is one gather over
+`next_state_table` applied to all states and actions at once.
+    `
+    from envs.cab_env import CabEnv
+    from algo.dynamic_programming.dynamic_programming import q_iteration, score_q_table
+    env = CabEnv()
+    optimal_q, iteration_info = q_iteration(env, gamma=0.9)
+    score_q_table(env, learned_q, optimal_q)
+    `
+"""
+import numpy as np
+import pandas as pd
+
+
+def bellman_backup(env, values, gamma):
+    """
+    One synchronous Bellman backup of a state-value function into action values
+    :param env: environment with `next_state_table`, `reward_table` and `done_table`
+    :param values: state values, shape (num_state,)
+    :param gamma: discount factor
+    :return: action values, shape (num_state, num_action)
+    """
+    # a terminal transition has no expected future rewards
+    return env.reward_table + gamma * np.where(
+        env.done_table, 0.0, values[env.next_state_table]
+    )
+
+
+def q_iteration(env, gamma, tol=1e-8, max_iter=10000, q_table=None, verbose=False):
+    """
+    Synchronous Q-iteration: Q(s, a) <- R(s, a) + gamma * max Q(s', a')
+    :param env: environment with compiled dynamics tables
+    :param gamma: discount factor
+    :param tol: stop when the largest change of one iteration is below this value
+    :param max_iter: maximum number of iterations
+    :param q_table: initial Q-table, zeros if not given
+    :param verbose: print the change of every iteration
+    :return: q_table, iteration_info
+    """
+    if q_table is None:
+        q_table = np.zeros(env.next_state_table.shape)
+    deltas = []
+    for iteration in range(1, max_iter + 1):
+        new_q_table = bellman_backup(env, q_table.max(axis=1), gamma)
+        deltas.append(np.abs(new_q_table - q_table).max())
+        q_table = new_q_table
+        if verbose:
+            print(f"Iteration: {iteration}, delta: {deltas[-1]}")
+        if deltas[-1] < tol:
+            break
+    return q_table, iteration_report(deltas, tol)
+
+
+def value_iteration(env, gamma, tol=1e-8, max_iter=10000, verbose=False):
+    """
+    Value iteration: V(s) <- max_a R(s, a) + gamma * V(s')
+    :param env: environment with compiled dynamics tables
+    :param gamma: discount factor
+    :param tol: stop when the largest change of one iteration is below this value
+    :param max_iter: maximum number of iterations
+    :param verbose: print the change of every iteration
+    :return: values, q_table, iteration_info
+    """
+    values = np.zeros(env.next_state_table.shape[0])
+    deltas = []
+    for iteration in range(1, max_iter + 1):
+        new_values = bellman_backup(env, values, gamma).max(axis=1)
+        deltas.append(np.abs(new_values - values).max())
+        values = new_values
+        if verbose:
+            print(f"Iteration: {iteration}, delta: {deltas[-1]}")
+        if deltas[-1] < tol:
+            break
+    return values, bellman_backup(env, values, gamma), iteration_report(deltas, tol)
+
+
+def evaluate_policy(env, policy, gamma, tol=1e-8, max_iter=10000, values=None):
+    """
+    Iterative evaluation of a deterministic policy
+    :param env: environment with compiled dynamics tables
+    :param policy: action of each state, shape (num_state,)
+    :param gamma: discount factor
+    :param tol: stop when the largest change of one sweep is below this value
+    :param max_iter: maximum number of sweeps
+    :param values: initial state values, zeros if not given
+    :return: state values of the policy
+    """
+    states = np.arange(len(policy))
+    next_states = env.next_state_table[states, policy]
+    rewards = env.reward_table[states, policy]
+    continues = ~env.done_table[states, policy]
+    if values is None:
+        values = np.zeros(len(policy))
+    for _ in range(max_iter):
+        new_values = rewards + gamma * np.where(continues, values[next_states], 0.0)
+        delta = np.abs(new_values - values).max()
+        values = new_values
+        if delta < tol:
+            break
+    return values
+
+
+def policy_iteration(env, gamma, tol=1e-8, max_iter=1000, verbose=False):
+    """
+    Policy iteration: evaluate the current policy, then improve it greedily until it is stable
+    :param env: environment with compiled dynamics tables
+    :param gamma: discount factor
+    :param tol: tolerance of each policy evaluation
+    :param max_iter: maximum number of improvement steps
+    :param verbose: print the number of changed actions of every iteration
+    :return: policy, values, q_table, iteration_info
+    """
+    policy = np.zeros(env.next_state_table.shape[0], dtype=np.int64)
+    values = None
+    changes = []
+    for iteration in range(1, max_iter + 1):
+        values = evaluate_policy(env, policy, gamma, tol, values=values)
+        q_table = bellman_backup(env, values, gamma)
+        # keep the current action on ties so that the loop terminates
+        current_q = q_table[np.arange(len(policy)), policy]
+        new_policy = np.where(
+            q_table.max(axis=1) > current_q + tol, q_table.argmax(axis=1), policy
+        )
+        changes.append(np.count_nonzero(new_policy != policy))
+        policy = new_policy
+        if verbose:
+            print(f"Iteration: {iteration}, changed actions: {changes[-1]}")
+        if changes[-1] == 0:
+            break
+    iteration_info = pd.DataFrame(
+        {"iteration": range(1, len(changes) + 1), "changed_actions": changes}
+    )
+    iteration_info.attrs["converged"] = changes[-1] == 0
+    return policy, values, q_table, iteration_info
+
+
+def iteration_report(deltas, tol):
+    """
+    :param deltas: largest change of each iteration
+    :param tol: convergence tolerance
+    :return: DataFrame of iteration and delta, with `attrs["converged"]`
+    """
+    iteration_info = pd.DataFrame(
+        {"iteration": range(1, len(deltas) + 1), "delta": deltas}
+    )
+    iteration_info.attrs["converged"] = bool(deltas[-1] < tol)
+    return iteration_info
+
+
+def score_q_table(env, q_table, optimal_q, tol=1e-6):
+    """
+    Score a learned Q-table against the optimal one without rollouts
+    :param env: environment with compiled dynamics tables and `init_state_distribution`
+    :param q_table: learned Q-table
+    :param optimal_q: optimal Q-table, e.g. from `q_iteration`
+    :param tol: tolerance when comparing action values
+    :return: dictionary
+        "optimal_action_rate": share of start states where the greedy action of `q_table` is optimal
+        "value_gap": expected loss of taking the greedy action of `q_table` once from a start state
+        "max_abs_error": largest absolute difference between the two tables
+    """
+    start_states = np.flatnonzero(env.init_state_distribution)
+    weights = env.init_state_distribution[start_states]
+    optimal_values = optimal_q[start_states].max(axis=1)
+    greedy_values = optimal_q[start_states, q_table[start_states].argmax(axis=1)]
+    return {
+        "optimal_action_rate": float(
+            np.sum(weights * (greedy_values >= optimal_values - tol))
+        ),
+        "value_gap": float(np.sum(weights * (optimal_values - greedy_values))),
+        "max_abs_error": float(np.abs(q_table - optimal_q).max()),
+    }
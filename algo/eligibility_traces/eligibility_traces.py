@@ -0,0 +1,288 @@
+"""
+This module contains tabular learners with eligibility traces: SARSA(lambda) and Watkins Q(lambda).
+The terminal reward is propagated back along the whole recent trajectory at every step, instead of one step per visit.
+
+Traces are kept as a sparse active set of recently visited state-actions: a trace is dropped once it decays below
+`min_trace`, so the cost of each step depends on the trace length and not on the size of the Q-table.
+    `
+    from algo.eligibility_traces.eligibility_traces import sarsa_lambda
+    q_table, training_info = sarsa_lambda(env, penalty, max_eps, alpha, gamma, lambda_, epsilon_start)
+    `
+"""
+import random
+import numpy as np
+
+from algo.basic_q_learning.q_learning import reward_dtype
+from algo.basic_q_learning.training_metrics import (
+    Q_LEARNING_COLUMNS,
+    TrainingMetrics,
+    print_progress,
+)
+from algo.e_greedy.epsilon_greedy import get_epsilon
+
+
+class ActiveTraces:
+    """
+    Replacing eligibility traces of the recently visited state-actions, as flat Q-table indices and values
+    """
+
+    def __init__(self, min_trace):
+        """
+        :param min_trace: traces below this value are dropped
+        """
+        self.min_trace = min_trace
+        self.indices = np.empty(0, dtype=np.int64)
+        self.values = np.empty(0)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def visit(self, index):
+        """
+        Set the trace of a visited state-action to 1
+        :param index: flat Q-table index of the state-action
+        :return: None
+        """
+        position = np.flatnonzero(self.indices == index)
+        if len(position):
+            self.values[position] = 1.0
+        else:
+            self.indices = np.append(self.indices, index)
+            self.values = np.append(self.values, 1.0)
+
+    def update(self, q_table, step):
+        """
+        Move every traced Q-value by `step` times its trace
+        :param q_table: Q-table, updated in place
+        :param step: alpha * TD error
+        :return: None
+        """
+        q_table.flat[self.indices] += step * self.values
+
+    def decay(self, factor):
+        """
+        :param factor: gamma * lambda
+        :return: None
+        """
+        self.values *= factor
+        active = self.values >= self.min_trace
+        if not active.all():
+            self.indices, self.values = self.indices[active], self.values[active]
+
+    def clear(self):
+        """
+        :return: None
+        """
+        self.indices = self.indices[:0]
+        self.values = self.values[:0]
+
+
+def select_action(env, q_table, state, epsilon):
+    """
+    Epsilon-greedy action selection, the same as `q_learning`
+    :param env: environment
+    :param q_table: Q-table
+    :param state: current state
+    :param epsilon: epsilon of the episode
+    :return: action
+    """
+    if random.uniform(0, 1) < epsilon:
+        return env.action_space.sample()  # Explore action space
+    return np.argmax(q_table[state])  # Exploit learned values
+
+
+def eligibility_trace_learning(
+    env,
+    penalty,
+    max_eps,
+    alpha,
+    gamma,
+    lambda_,
+    epsilon_start,
+    strategy="linear",
+    epsilon_decay=None,
+    method="sarsa",
+    min_trace=1e-3,
+    q_table=None,
+    progress=print_progress,
+    progress_every=100,
+):
+    """
+    Tabular learning with eligibility traces
+    :param env: environment
+    :param penalty: reward value counted as a penalty
+    :param max_eps: number of episodes
+    :param alpha: learning rate
+    :param gamma: discount factor
+    :param lambda_: trace decay rate
+    :param epsilon_start: starting epsilon
+    :param strategy: epsilon strategy, see `get_epsilon`
+    :param epsilon_decay: epsilon decay rate for exponential strategy
+    :param method: "sarsa" for SARSA(lambda) or "watkins" for Watkins Q(lambda)
+    :param min_trace: traces below this value are dropped from the active set
+    :param q_table: initial Q-table to warm-start from, zeros if not given
+    :param progress: callback `progress(episode, max_eps)` or None
+    :param progress_every: number of episodes between progress callbacks
+    :return: q_table, training_info in the same format as `q_learning`
+    """
+    if method not in ("sarsa", "watkins"):
+        raise ValueError("The method should be sarsa or watkins")
+
+    # initialise the q_table, or warm-start from a given one
+    if q_table is None:
+        q_table = np.zeros([env.observation_space.n, env.action_space.n])
+    else:
+        q_table = np.array(q_table, dtype=np.float64)
+    num_action = q_table.shape[1]
+
+    # initialise training information
+    metrics = TrainingMetrics(
+        max_eps, dict(Q_LEARNING_COLUMNS, total_rewards=reward_dtype(env))
+    )
+    traces = ActiveTraces(min_trace)
+
+    for episode in range(1, max_eps + 1):
+        # reset the environment and the traces at the beginning of episode
+        state = env.reset()
+        traces.clear()
+
+        # initialise training info of each episode
+        step_count, penalty_count, total_reward, max_q_delta, sum_q_delta = (
+            0,
+            0,
+            0,
+            0.0,
+            0.0,
+        )
+        termination = False
+
+        # get epsilon of the episode
+        epsilon = get_epsilon(epsilon_start, max_eps, episode, strategy, epsilon_decay)
+        action = select_action(env, q_table, state, epsilon)
+
+        # keep updating until get termination signal
+        while not termination:
+            # gather new state from action
+            new_state, reward, termination, _ = env.step(action)
+
+            # the next action is chosen before the update, as SARSA needs it for the target
+            new_action = (
+                None if termination else select_action(env, q_table, new_state, epsilon)
+            )
+
+            # TD error, a terminal state has no expected future rewards
+            if termination:
+                expected = 0.0
+            elif method == "sarsa":
+                expected = q_table[new_state, new_action]
+            else:
+                expected = np.max(q_table[new_state])
+            td_error = reward + gamma * expected - q_table[state, action]
+
+            # Watkins Q(lambda) cuts the traces after an exploratory (non-greedy) action
+            explored = (
+                method == "watkins"
+                and not termination
+                and q_table[new_state, new_action] < expected
+            )
+
+            # update every state-action of the active set
+            traces.visit(state * num_action + action)
+            traces.update(q_table, alpha * td_error)
+
+            if explored:
+                traces.clear()
+            else:
+                traces.decay(gamma * lambda_)
+
+            # gather training info
+            q_delta = abs(alpha * td_error)
+            max_q_delta = max(max_q_delta, q_delta)
+            sum_q_delta += q_delta
+            step_count += 1
+            if reward == penalty:
+                penalty_count += 1
+            total_reward += reward
+
+            # assign the new state and action
+            state, action = new_state, new_action
+
+        metrics.record(
+            episode,
+            num_steps=step_count,
+            num_penalties=penalty_count,
+            total_rewards=total_reward,
+            epsilon=epsilon,
+            max_q_delta=max_q_delta,
+            mean_q_delta=sum_q_delta / step_count,
+        )
+
+        if progress is not None and episode % progress_every == 0:
+            progress(episode, max_eps)
+
+    print("\nTraining finished.\n")
+
+    return q_table, metrics.to_frame()
+
+
+def sarsa_lambda(
+    env,
+    penalty,
+    max_eps,
+    alpha,
+    gamma,
+    lambda_,
+    epsilon_start,
+    strategy="linear",
+    epsilon_decay=None,
+    **kwargs
+):
+    """
+    SARSA(lambda), on-policy learning with eligibility traces, see `eligibility_trace_learning`
+    :return: q_table, training_info
+    """
+    return eligibility_trace_learning(
+        env,
+        penalty,
+        max_eps,
+        alpha,
+        gamma,
+        lambda_,
+        epsilon_start,
+        strategy,
+        epsilon_decay,
+        method="sarsa",
+        **kwargs
+    )
+
+
+def watkins_q_lambda(
+    env,
+    penalty,
+    max_eps,
+    alpha,
+    gamma,
+    lambda_,
+    epsilon_start,
+    strategy="linear",
+    epsilon_decay=None,
+    **kwargs
+):
+    """
+    Watkins Q(lambda), off-policy Q-learning with traces cut after exploratory actions,
+    see `eligibility_trace_learning`
+    :return: q_table, training_info
+    """
+    return eligibility_trace_learning(
+        env,
+        penalty,
+        max_eps,
+        alpha,
+        gamma,
+        lambda_,
+        epsilon_start,
+        strategy,
+        epsilon_decay,
+        method="watkins",
+        **kwargs
+    )
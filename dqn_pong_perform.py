@@ -5,8 +5,12 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
-from algo.dqn_pygame_pong import agent
+# the agent, and so TensorFlow, is only imported inside the training functions, as the "spawn" actor processes
+# of `perform_actor_learner` import this module again
+from algo.dqn_pygame_pong.actor_learner import train_actor_learner
+from algo.dqn_pygame_pong.numpy_policy import apex_epsilons
 from envs import pong_env
+from envs.vector_pong_env import VectorPong
 from helpers.visualising_helper import plot_training_pong
 
 # environment definition
@@ -16,6 +20,9 @@ STATE_COUNT = 5
 # maximum frame (observation) to stop the train if average score not archived
 MAXIMUM_FRAME_COUNT = 20000
 
+# training cadence: one batch every few frames once the random warm-up frames are memorised
+TRAIN_FREQUENCY = 4
+
 SCREEN_SIZE = (400, 400)
 
 
@@ -42,18 +49,57 @@ def normalise_state(
     )
 
 
-def perform():
+def perform(
+    render=False,
+    prioritized=False,
+    target_sync_period=None,
+    double_dqn=False,
+    train_frequency=TRAIN_FREQUENCY,
+    gradient_steps=1,
+    replay_ratio=None,
+    warmup_size=None,
+    target_sync_interval=None,
+    prefetch=False,
+):
     """
     The main training loop of agent
+    :param render: show the game in a Pygame window at `pong_env.FPS`, headless and unthrottled if False
+    :param prioritized: train from prioritized experience replay instead of uniform sampling
+    :param target_sync_period: training steps between target network syncs, no target network if None
+    :param double_dqn: use Double DQN targets
+    :param train_frequency: frames between training updates, see `TrainingScheduler`
+    :param gradient_steps: training steps per update
+    :param replay_ratio: replayed samples per frame, overrides `gradient_steps` if given
+    :param warmup_size: experiences in memory before training starts, `agent.MEMORISE_DURATION` if None
+    :param target_sync_interval: frames between target network syncs, instead of `target_sync_period`
+    :param prefetch: sample the next training batch on a background thread
     :return: graph for performance history
     """
+    from algo.dqn_pygame_pong import agent
+    from algo.dqn_pygame_pong.training_scheduler import TrainingScheduler
+
     frame = 0
     history = []
 
-    env = pong_env.PongGame()
+    env = pong_env.PongGame(render=render)
     env.init_render()
 
-    _agent = agent.Agent(STATE_COUNT, ACTION_COUNT)
+    _agent = agent.Agent(
+        STATE_COUNT,
+        ACTION_COUNT,
+        prioritized=prioritized,
+        target_sync_period=target_sync_period,
+        double_dqn=double_dqn,
+        prefetch=prefetch,
+    )
+    scheduler = TrainingScheduler(
+        _agent,
+        train_frequency=train_frequency,
+        gradient_steps=gradient_steps,
+        replay_ratio=replay_ratio,
+        warmup_size=agent.MEMORISE_DURATION if warmup_size is None else warmup_size,
+        target_sync_interval=target_sync_interval,
+    )
 
     best_action = 0
 
@@ -79,7 +125,7 @@ def perform():
         )
 
         _agent.record_experience((state, best_action, _score, next_state))
-        _agent.train()
+        scheduler.step()
 
         state = next_state
 
@@ -93,6 +139,14 @@ def perform():
             )
             history.append((frame, env.score_display, _agent.epsilon))
 
+    print(f"\nTraining schedule: {scheduler.report()}")
+    if _agent.prefetcher is not None:
+        print(
+            f"Prefetcher stalls: {_agent.prefetcher.stall_count}/{_agent.prefetcher.batch_count}"
+            f" batches, {_agent.prefetcher.stall_time:.3f}s"
+        )
+    _agent.close()
+
     x_val = [item[0] for item in history]
     score_history = [item[1] for item in history]
     epsilon_history = [item[2] for item in history]
@@ -105,5 +159,94 @@ def perform():
 
     plot_training_pong(pd.DataFrame(history_dict))
 
+def perform_vectorised(
+    num_games=64,
+    max_frames=200000,
+    apex_epsilon=False,
+    agent_kwargs=None,
+    scheduler_kwargs=None,
+):
+    """
+    Training loop over many games at once: one `VectorPong` step and one batched action selection per frame
+    :param num_games: number of games stepped together
+    :param max_frames: number of frames to collect over every game
+    :param apex_epsilon: give every game a fixed exploration rate from `apex_epsilons`
+    instead of the decayed epsilon of the agent
+    :param agent_kwargs: keyword arguments of `agent.Agent`
+    :param scheduler_kwargs: keyword arguments of `TrainingScheduler`, the cadence of `perform` if not given
+    :return: graph for performance history
+    """
+    from algo.dqn_pygame_pong import agent
+    from algo.dqn_pygame_pong.training_scheduler import TrainingScheduler
+
+    history = []
+
+    env = VectorPong(num_games)
+    _agent = agent.Agent(STATE_COUNT, ACTION_COUNT, **(agent_kwargs or {}))
+    scheduler = TrainingScheduler(
+        _agent,
+        **(scheduler_kwargs or {"train_frequency": TRAIN_FREQUENCY, "warmup_size": agent.MEMORISE_DURATION})
+    )
+    epsilons = apex_epsilons(num_games) if apex_epsilon else None
+    dones = np.zeros(num_games, dtype=bool)  # Pong games do not terminate
+
+    state = env.reset()
+    for frame in range(num_games, max_frames + 1, num_games):
+        best_action = _agent.select_actions(state, epsilons)
+        next_state, _score = env.step(best_action)
+
+        _agent.record_experiences(state, best_action, _score, next_state, dones)
+        scheduler.step(num_games)
+
+        state = next_state
+
+        if frame // (200 * num_games) > (frame - num_games) // (200 * num_games):
+            print(
+                f"\nFrame: {frame}"
+                f"\nScore: {env.score_display.mean(): .2f}"
+                f"\nEpsilon: {_agent.epsilon}"
+            )
+            history.append((frame, env.score_display.mean(), _agent.epsilon))
+
+    _agent.close()
+    print(f"\nTraining schedule: {scheduler.report()}")
+
+    history_dict = {
+        'frame_idx': [item[0] for item in history],
+        'score': [item[1] for item in history],
+        'epsilon': [item[2] for item in history]
+    }
+
+    plot_training_pong(pd.DataFrame(history_dict))
+
+
+def perform_actor_learner(
+    num_actors=2, games_per_actor=32, max_frames=200000, **kwargs
+):
+    """
+    Training with several actor processes collecting experience for one learner, see `train_actor_learner`
+    :param num_actors: number of actor processes
+    :param games_per_actor: number of games stepped together by each actor
+    :param max_frames: number of frames to collect over every game
+    :param kwargs: other keyword arguments of `train_actor_learner`
+    :return: graph for performance history
+    """
+    _agent, scheduler, history = train_actor_learner(
+        num_actors=num_actors,
+        games_per_actor=games_per_actor,
+        max_frames=max_frames,
+        **kwargs
+    )
+    print(f"\nTraining schedule: {scheduler.report()}")
+
+    history_dict = {
+        'frame_idx': [item[0] for item in history],
+        'score': [item[1] for item in history],
+        'epsilon': [item[2] for item in history]
+    }
+
+    plot_training_pong(pd.DataFrame(history_dict))
+
+
 if __name__ == "__main__":
     perform()
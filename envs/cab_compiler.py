@@ -0,0 +1,205 @@
+"""
+This module compiles a Cab layout into dense dynamics tables.
+Every transition, reward and termination flag is computed with broadcast NumPy operations over
+the whole (y, x, passenger, destination) grid, instead of looping over each state-action in Python.
+    `
+    from envs.cab_compiler import compile_layout
+    dynamics = compile_layout(CabEnv.layout, CabEnv.location_names, CabEnv.reward_dict)
+    dynamics["next_state"][state, action]
+    `
+
+    Compiled tables can be cached on disk, so that many workers on one machine share the same page-cached copy
+    `
+    dynamics = load_or_compile_layout(CabEnv.layout, CabEnv.location_names, CabEnv.reward_dict, "~/.cache/cab")
+    `
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+# number of actions: South, North, East, West, Pick-up, Drop-off
+NUM_ACTION = 6
+
+# bump when the compiled format changes so that stale caches are not loaded
+CACHE_VERSION = 1
+CACHE_ARRAYS = ["next_state", "reward", "done", "init_state_distribution"]
+
+
+def scan_locations(layout, location_names):
+    """
+    Scan the layout and find the grid coordinates of each named location
+    :param layout: layout as char array (`np.asarray(LAYOUT, dtype="c")`)
+    :param location_names: list of location names in the layout
+    :return: list of (y, x) coordinates in the same order as `location_names`
+    """
+    locations = []
+    for location_name in location_names:
+        [[y_temp, x_temp]] = np.argwhere(layout == bytes(location_name, encoding="utf-8"))
+        locations.append((int(y_temp - 1), int((x_temp - 1) / 2)))
+    return locations
+
+
+def scan_walls(layout):
+    """
+    Turn the vertical walls of the layout into boolean masks of open sides
+    :param layout: layout as char array
+    :return: (east_open, west_open), each of shape (num_y, num_x)
+    """
+    # the cell at column x is drawn at 2x + 1, its sides are at 2x and 2x + 2
+    east_open = layout[1:-1, 2::2] == b":"
+    west_open = layout[1:-1, 0:-1:2] == b":"
+    return east_open, west_open
+
+
+def compile_layout(layout, location_names, reward_dict):
+    """
+    Compute the full deterministic dynamics of a Cab layout
+    :param layout: layout as char array
+    :param location_names: list of location names in the layout
+    :param reward_dict: dictionary with "step", "penalty" and "final_reward"
+    :return: dictionary of arrays
+        "next_state": next state id, shape (num_state, num_action)
+        "reward": reward, shape (num_state, num_action)
+        "done": termination flag, shape (num_state, num_action)
+        "init_state_distribution": probability of starting at each state, shape (num_state,)
+    """
+    locations = scan_locations(layout, location_names)
+    num_location = len(locations)
+    num_passenger = num_location + 1  # the last passenger id is when passenger is in the cab
+    num_x = int((len(layout[1, :]) - 1) / 2)
+    num_y = int(len(layout[:, 1]) - 2)
+    loc_y = np.array([location[0] for location in locations])
+    loc_x = np.array([location[1] for location in locations])
+
+    # state grid, indexed the same way as `CabEnv.generate_state_id`
+    _y, _x, passenger_id, destination_id = np.meshgrid(
+        np.arange(num_y),
+        np.arange(num_x),
+        np.arange(num_passenger),
+        np.arange(num_location),
+        indexing="ij",
+    )
+    in_cab = passenger_id == num_location
+
+    # movement
+    east_open, west_open = scan_walls(layout)
+    south_y = np.minimum(_y + 1, num_y - 1)
+    north_y = np.maximum(_y - 1, 0)
+    east_x = np.where(east_open[_y, _x], np.minimum(_x + 1, num_x - 1), _x)
+    west_x = np.where(west_open[_y, _x], np.maximum(_x - 1, 0), _x)
+
+    # pick-up correctly when the cab is at the passenger location
+    # (-1 padding so that a passenger in the cab never matches)
+    pad = np.full(1, -1)
+    at_passenger = (_y == np.concatenate([loc_y, pad])[passenger_id]) & (
+        _x == np.concatenate([loc_x, pad])[passenger_id]
+    )
+    pick_up_passenger = np.where(at_passenger, num_location, passenger_id)
+
+    # drop-off: at destination, at another location, or outside any location
+    at_destination = (_y == loc_y[destination_id]) & (_x == loc_x[destination_id])
+    location_grid = np.full((num_y, num_x), -1)
+    # reversed so that the first location wins on shared cells, as `list.index` does
+    location_grid[loc_y[::-1], loc_x[::-1]] = np.arange(num_location)[::-1]
+    cab_location_id = location_grid[_y, _x]
+    drop_off_done = at_destination & in_cab
+    drop_off_moved = ~drop_off_done & (cab_location_id >= 0) & in_cab
+    drop_off_passenger = np.where(
+        drop_off_done,
+        destination_id,
+        np.where(drop_off_moved, cab_location_id, passenger_id),
+    )
+
+    # stack per action, last axis is the action
+    new_y = np.stack([south_y, north_y, _y, _y, _y, _y], axis=-1)
+    new_x = np.stack([_x, _x, east_x, west_x, _x, _x], axis=-1)
+    new_passenger_id = np.stack(
+        [passenger_id] * 4 + [pick_up_passenger, drop_off_passenger], axis=-1
+    )
+    next_state = (
+        (new_y * num_x + new_x) * num_passenger + new_passenger_id
+    ) * num_location + destination_id[..., None]
+
+    step, penalty, final_reward = (
+        reward_dict.get("step"),
+        reward_dict.get("penalty"),
+        reward_dict.get("final_reward"),
+    )
+    reward = np.full(next_state.shape, step, dtype=np.result_type(*reward_dict.values()))
+    reward[..., 4] = np.where(at_passenger, step, penalty)
+    reward[..., 5] = np.where(
+        drop_off_done, final_reward, np.where(drop_off_moved, step, penalty)
+    )
+    done = np.zeros(next_state.shape, dtype=bool)
+    done[..., 5] = drop_off_done
+
+    # passenger is waiting at a pick-up location which is not the destination
+    init_state_distribution = (
+        ~in_cab & (passenger_id != destination_id)
+    ).astype(np.float64)
+    init_state_distribution /= init_state_distribution.sum()
+
+    num_state = num_y * num_x * num_passenger * num_location
+    return {
+        "next_state": next_state.reshape(num_state, NUM_ACTION).astype(np.int32),
+        "reward": reward.reshape(num_state, NUM_ACTION),
+        "done": done.reshape(num_state, NUM_ACTION),
+        "init_state_distribution": init_state_distribution.reshape(num_state),
+    }
+
+
+def layout_key(layout, location_names, reward_dict):
+    """
+    Hash the layout definition into a cache key
+    :param layout: layout as char array (`np.asarray(LAYOUT, dtype="c")`)
+    :param location_names: list of location names in the layout
+    :param reward_dict: dictionary with "step", "penalty" and "final_reward"
+    :return: hex digest
+    """
+    layout = np.asarray(layout, dtype="c")
+    definition = json.dumps(
+        {
+            "version": CACHE_VERSION,
+            "layout_shape": list(layout.shape),
+            "layout": layout.tobytes().hex(),
+            "location_names": list(location_names),
+            "reward_dict": reward_dict,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(definition.encode("utf-8")).hexdigest()[:20]
+
+
+def load_or_compile_layout(layout, location_names, reward_dict, cache_dir):
+    """
+    Load the compiled dynamics of a layout from the cache directory, compiling and saving them on a miss.
+    Arrays are stored as one `.npy` file each and loaded read-only with memory mapping.
+    :param layout: layout as char array (`np.asarray(LAYOUT, dtype="c")`), the same as `compile_layout`
+    :param location_names: list of location names in the layout
+    :param reward_dict: dictionary with "step", "penalty" and "final_reward"
+    :param cache_dir: cache directory
+    :return: dictionary of arrays, the same as `compile_layout`
+    """
+    cache_dir = os.path.expanduser(cache_dir)
+    path = os.path.join(cache_dir, layout_key(layout, location_names, reward_dict))
+
+    if not os.path.isdir(path):
+        dynamics = compile_layout(layout, location_names, reward_dict)
+        # write to a temporary directory then rename, so that a partial cache is never loaded
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = tempfile.mkdtemp(prefix=".tmp-", dir=cache_dir)
+        for name in CACHE_ARRAYS:
+            np.save(os.path.join(temp_path, name + ".npy"), dynamics.get(name))
+        try:
+            os.rename(temp_path, path)
+        except OSError:
+            # another worker has written the same layout first
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+    return {
+        name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r").view(np.ndarray)
+        for name in CACHE_ARRAYS
+    }
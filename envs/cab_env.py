@@ -15,6 +15,7 @@
     `
 """
 
+import os
 import sys
 import io
 import contextlib
@@ -23,6 +24,8 @@ from gym import utils
 
 from gym.envs.toy_text.discrete import DiscreteEnv
 
+from envs.cab_compiler import compile_layout, load_or_compile_layout, scan_locations
+
 
 class CabEnv(DiscreteEnv):
     """
@@ -144,15 +147,13 @@ class CabEnv(DiscreteEnv):
     # reward/ penalty dictionary
     reward_dict = {"step": -1, "penalty": -30, "final_reward": 60}
 
-    def __init__(self):
+    def __init__(self, cache_dir=None):
+        """
+        :param cache_dir: directory to cache the compiled dynamics in, defaults to the `CAB_CACHE_DIR`
+        environment variable, the dynamics are compiled in memory if neither is set
+        """
         # scan the layout and define location coordinates
-        self.locations = []
-        for location_name in self.location_names:
-            [[y_temp, x_temp]] = np.argwhere(
-                self.layout == bytes(location_name, encoding="utf-8")
-            )
-            y_location, x_location = int(y_temp - 1), int((x_temp - 1) / 2)
-            self.locations.append((y_location, x_location))
+        self.locations = scan_locations(self.layout, self.location_names)
         self.num_location = len(self.locations)
         self.location_ids = list(range(self.num_location))
 
@@ -170,103 +171,81 @@ class CabEnv(DiscreteEnv):
         self.state_count = (
             self.num_x * self.num_y * len(self.locations) * len(self.passenger_ids)
         )
-        self.init_state_distribution = np.zeros(self.state_count)
-
-        # init state-action map
-        self.P = {
-            state: {action: [] for action in self.actions}
-            for state in range(self.state_count)
-        }
-
-        # init environment mechanism
-        for _y in range(self.num_y):
-            for _x in range(self.num_x):
-                for passenger_id in self.passenger_ids:
-                    for destination_id in self.location_ids:
-                        state = self.generate_state_id(
-                            _y, _x, passenger_id, destination_id
-                        )
 
-                        # passenger is at pick-up location
-                        if (
-                            passenger_id < self.num_location
-                            and passenger_id != destination_id
-                        ):
-                            self.init_state_distribution[state] += 1
-
-                        for action in self.actions:
-                            # default: not moving, no pick-up/dr op-off, no termination
-                            new_y, new_x, new_passenger_id = _y, _x, passenger_id
-                            reward = self.reward_dict.get("step")
-                            termination = False
-                            cab_location = (_y, _x)
-
-                            # action conditions
-                            if action == 0:
-                                new_y = min(_y + 1, self.x_max)
-
-                            elif action == 1:
-                                new_y = max(_y - 1, 0)
-
-                            elif (
-                                action == 2 and self.layout[_y + 1, _x * 2 + 2] == b":"
-                            ):
-                                new_x = min(_x + 1, self.y_max)
-
-                            elif action == 3 and self.layout[_y + 1, _x * 2] == b":":
-                                new_x = max(_x - 1, 0)
-
-                            # pick-up
-                            elif action == 4:
-                                # pick-up correctly (the last passenger_id is when passenger in the cab)
-                                if (passenger_id < self.num_location) and (
-                                    cab_location == self.locations[passenger_id]
-                                ):
-                                    new_passenger_id = self.passenger_ids[-1]
-                                # pick-up at wrong location
-                                else:
-                                    reward = self.reward_dict.get("penalty")
-
-                            # drop-off
-                            elif action == 5:
-                                # drop-off correctly
-                                if (
-                                    cab_location == self.locations[destination_id]
-                                ) and (passenger_id == self.passenger_ids[-1]):
-                                    new_passenger_id = destination_id
-                                    termination = True
-                                    reward = self.reward_dict.get("final_reward")
-                                # drop off in selected location but not in destination
-                                elif (cab_location in self.locations) and (
-                                    passenger_id == self.passenger_ids[-1]
-                                ):
-                                    new_passenger_id = self.locations.index(
-                                        cab_location
-                                    )
-                                # drop off outside selected location
-                                else:
-                                    reward = self.reward_dict.get("penalty")
-
-                            # assign the state
-                            new_state = self.generate_state_id(
-                                new_y, new_x, new_passenger_id, destination_id
-                            )
-
-                            # fill in state-action map
-                            # as the environment is deterministic, we set the probability 1.0
-                            self.P[state][action].append(
-                                (1.0, new_state, reward, termination)
-                            )
-
-        self.init_state_distribution /= self.init_state_distribution.sum()
+        # compile the layout into dense dynamics tables, indexed by [state, action]
+        # as the environment is deterministic, one next state per state-action is enough
+        # both paths compile `self.layout`, the cache is keyed on its contents
+        cache_dir = cache_dir or os.environ.get("CAB_CACHE_DIR")
+        if cache_dir:
+            dynamics = load_or_compile_layout(
+                self.layout, self.location_names, self.reward_dict, cache_dir
+            )
+        else:
+            dynamics = compile_layout(
+                self.layout, self.location_names, self.reward_dict
+            )
+        self.next_state_table = dynamics.get("next_state")
+        self.reward_table = dynamics.get("reward")
+        self.done_table = dynamics.get("done")
+        self.init_state_distribution = dynamics.get("init_state_distribution")
+
+        # the nested state-action map is only built when `P` is accessed
+        self._P = None
         DiscreteEnv.__init__(
             self,
             self.state_count,
             len(self.actions),
-            self.P,
+            None,
             self.init_state_distribution,
         )
 
+    @property
+    def P(self):
+        """
+        Compatibility view of the dynamics in the `DiscreteEnv` format, built on first access
+        `P[state][action] == [(probability, next_state, reward, done)]`
+        :return: nested state-action map
+        """
+        if self._P is None:
+            next_states = self.next_state_table.tolist()
+            rewards = self.reward_table.tolist()
+            dones = self.done_table.tolist()
+            # as the environment is deterministic, we set the probability 1.0
+            self._P = {
+                state: {
+                    action: [
+                        (
+                            1.0,
+                            next_states[state][action],
+                            rewards[state][action],
+                            dones[state][action],
+                        )
+                    ]
+                    for action in self.actions
+                }
+                for state in range(self.state_count)
+            }
+        return self._P
+
+    @P.setter
+    def P(self, value):
+        self._P = value
+
+    def step(self, a):
+        """
+        Take an action by indexing the dynamics tables instead of walking `P`
+        :param a: action id
+        :return: (next state, reward, termination, info)
+        """
+        s, r, d = (
+            int(self.next_state_table[self.s, a]),
+            self.reward_table[self.s, a].item(),
+            bool(self.done_table[self.s, a]),
+        )
+        self.s = s
+        self.lastaction = a
+        return s, r, d, {"prob": 1.0}
+
     def generate_state_id(self, _y, _x, passenger_id, destination_id):
         """
         This function generates a state index using the cab's coordinates, passenger status, and destination id
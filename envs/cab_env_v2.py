@@ -21,5 +21,5 @@ class CabEnvV2(CabEnv):
     layout = np.asarray(LAYOUT, dtype="c")
     location_names = ["R", "G", "Y", "B", "K", "M"]
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, cache_dir=None):
+        super().__init__(cache_dir)
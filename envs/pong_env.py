@@ -2,12 +2,21 @@
 This module gives a customised version of Pong that uses Pygame. It's made to be used with reinforcement learning to teach a computer how to play Pong.
 
 Pong has a state space that includes the position and speed of the ball and paddles. The actions available are just moving the paddle up, down and stay sturdy.
+
+The game is headless by default: the physics run with a fixed timestep and no Pygame display, clock or font is created.
+Rendering is opt-in, and only then is the window opened and the game throttled to `FPS`.
+    `
+    env = PongGame()  # headless, as fast as the physics allow
+    env = PongGame(render=True)  # windowed at FPS frames per second
+    `
 """
 import random
 import pygame
 
 # define frame rate and window size for pygame to render
 FPS = 60
+# fixed physics timestep of every frame, rendered or not
+FRAME_STEP = 7.5
 WINDOW_SIZE = {"WIDTH": 400, "HEIGHT": 400}
 WINDOW_MARGIN = 15
 
@@ -29,7 +38,21 @@ COLOURS = {
     "GREEN": (0, 255, 0),
 }
 
-screen = pygame.display.set_mode((WINDOW_SIZE.get("WIDTH"), WINDOW_SIZE.get("HEIGHT")))
+# the window is only opened by the first rendered game
+screen = None
+
+
+def get_screen():
+    """
+    Open the Pygame window on first use
+    :return: display surface
+    """
+    global screen
+    if screen is None:
+        screen = pygame.display.set_mode(
+            (WINDOW_SIZE.get("WIDTH"), WINDOW_SIZE.get("HEIGHT"))
+        )
+    return screen
 
 
 def render_ball(_x_ball, _y_ball, _colour_ball):
@@ -43,7 +66,7 @@ def render_ball(_x_ball, _y_ball, _colour_ball):
     ball = pygame.Rect(
         _x_ball, _y_ball, BALL_SIZE.get("WIDTH"), BALL_SIZE.get("HEIGHT")
     )
-    pygame.draw.rect(screen, _colour_ball, ball)
+    pygame.draw.rect(get_screen(), _colour_ball, ball)
 
 
 def render_our_paddle(_y_paddle):
@@ -55,7 +78,7 @@ def render_our_paddle(_y_paddle):
     paddle = pygame.Rect(
         WINDOW_MARGIN, _y_paddle, PADDLE_SIZE.get("WIDTH"), PADDLE_SIZE.get("HEIGHT")
     )
-    pygame.draw.rect(screen, COLOURS.get("YELLOW"), paddle)
+    pygame.draw.rect(get_screen(), COLOURS.get("YELLOW"), paddle)
 
 
 def render_rival_paddle(_y_paddle):
@@ -70,7 +93,7 @@ def render_rival_paddle(_y_paddle):
         PADDLE_SIZE.get("WIDTH"),
         PADDLE_SIZE.get("HEIGHT"),
     )
-    pygame.draw.rect(screen, COLOURS.get("WHITE"), paddle)
+    pygame.draw.rect(get_screen(), COLOURS.get("WHITE"), paddle)
 
 
 def update_observation(
@@ -81,7 +104,7 @@ def update_observation(
     _x_ball_direction,
     _y_ball_direction,
     _colour_ball,
-    _d_frame_rate=7.5,
+    _d_frame_rate=FRAME_STEP,
 ):
     """
     Updates the view of the environment as a result of the agent's action.
@@ -160,7 +183,7 @@ def update_observation(
     ]
 
 
-def update_our_position(action, _y_paddle, _d_frame_rate):
+def update_our_position(action, _y_paddle, _d_frame_rate=FRAME_STEP):
     """
     Update our paddle position based on action taken.
     :param action:
@@ -168,7 +191,6 @@ def update_our_position(action, _y_paddle, _d_frame_rate):
     :param _d_frame_rate:
     :return: vertical position of our paddle
     """
-    _d_frame_rate = 7.5
     if action == 1:
         _y_paddle = _y_paddle - PADDLE_SPEED * _d_frame_rate
     if action == 2:
@@ -179,7 +201,7 @@ def update_our_position(action, _y_paddle, _d_frame_rate):
     return _y_paddle
 
 
-def update_rival_position(_y_paddle, _y_ball, _d_frame_rate):
+def update_rival_position(_y_paddle, _y_ball, _d_frame_rate=FRAME_STEP):
     """
     Update our paddle position based on action taken.
     :param _y_paddle:
@@ -187,7 +209,6 @@ def update_rival_position(_y_paddle, _y_ball, _d_frame_rate):
     :param _d_frame_rate:
     :return:
     """
-    _d_frame_rate = 7.5
     if (
         _y_paddle + PADDLE_SIZE.get("HEIGHT") / 2
         < _y_ball + BALL_SIZE.get("HEIGHT") / 2
@@ -209,9 +230,19 @@ class PongGame:
     Pong environment made for reinforcement learning agents.
     This class presents an customised version of the classic Pong game using the Pygame library.
     """
-    def __init__(self):
-        pygame.init()
-        pygame.display.set_caption("Pong Environment")
+    def __init__(self, render=False):
+        """
+        :param render: open a window and draw every frame at `FPS`, headless if False
+        """
+        self.render = render
+        self.clock = None
+        self.font = None
+        if self.render:
+            pygame.init()
+            pygame.display.set_caption("Pong Environment")
+            get_screen()
+            self.clock = pygame.time.Clock()
+            self.font = pygame.font.SysFont("calibri", 20)
 
         seed = random.randint(0, 9)
 
@@ -228,15 +259,12 @@ class PongGame:
 
         self.x_ball = WINDOW_SIZE.get("WIDTH") / 2 - BALL_SIZE.get("WIDTH") / 2
 
-        self.clock = pygame.time.Clock()
         self.colour_ball = COLOURS.get("WHITE")
 
         self.frame_display_count = 0
         self.score_display = -10.0
         self.epsilon_display = 1.0
 
-        self.font = pygame.font.SysFont("calibri", 20)
-
         if 0 < seed < 3:
             self.x_ball_direction = 1
             self.y_ball_direction = 1
@@ -261,8 +289,10 @@ class PongGame:
         Guide Pygame to render components on guilded colours
         :return: None
         """
+        if not self.render:
+            return
         pygame.event.pump()
-        screen.fill(COLOURS.get("BLACK"))
+        get_screen().fill(COLOURS.get("BLACK"))
         render_our_paddle(self.y_our_paddle)
         render_rival_paddle(self.y_rival_paddle)
         render_ball(self.x_ball, self.y_pong, COLOURS.get("WHITE"))
@@ -274,19 +304,8 @@ class PongGame:
         :param action:
         :return: observation as array
         """
-        delta_frame_time = self.clock.tick(FPS)
-        pygame.event.pump()
-        screen.fill(COLOURS.get("BLACK"))
-
-        self.y_our_paddle = update_our_position(
-            action, self.y_our_paddle, delta_frame_time
-        )
-        render_our_paddle(self.y_our_paddle)
-
-        self.y_rival_paddle = update_rival_position(
-            self.y_rival_paddle, self.y_pong, delta_frame_time
-        )
-        render_rival_paddle(self.y_rival_paddle)
+        self.y_our_paddle = update_our_position(action, self.y_our_paddle)
+        self.y_rival_paddle = update_rival_position(self.y_rival_paddle, self.y_pong)
 
         [
             score,
@@ -305,37 +324,52 @@ class PongGame:
             self.colour_ball
         )
 
-        render_ball(self.x_ball, self.y_pong, self.colour_ball)
-
         if score > 0.5 or score < -0.5:
             self.score_display = 0.05 * score + self.score_display * 0.95
 
+        if self.render:
+            self.render_frame()
+
+        return [
+            score,
+            self.y_our_paddle,
+            self.x_ball,
+            self.y_pong,
+            self.x_ball_direction,
+            self.y_ball_direction,
+        ]
+
+    def render_frame(self):
+        """
+        Draw the current frame with the score, time and epsilon, throttled to `FPS`
+        :return: None
+        """
+        self.clock.tick(FPS)
+        pygame.event.pump()
+        _screen = get_screen()
+        _screen.fill(COLOURS.get("BLACK"))
+
+        render_our_paddle(self.y_our_paddle)
+        render_rival_paddle(self.y_rival_paddle)
+        render_ball(self.x_ball, self.y_pong, self.colour_ball)
+
         _score_display = self.font.render(
             "Score: " + str("{0:.2f}".format(self.score_display)), True, (255, 255, 255)
         )
-        screen.blit(_score_display, (50.0, 20.0))
+        _screen.blit(_score_display, (50.0, 20.0))
 
         _time_display = self.font.render(
             "Time: " + str(self.frame_display_count), True, (255, 255, 255)
         )
-        screen.blit(_time_display, (50.0, 40.0))
+        _screen.blit(_time_display, (50.0, 40.0))
 
         _epsilon_display = self.font.render(
             "Ep: " + str("{0:.4f}".format(self.epsilon_display)), True, (255, 255, 255)
         )
-        screen.blit(_epsilon_display, (50.0, 60.0))
+        _screen.blit(_epsilon_display, (50.0, 60.0))
 
         pygame.display.flip()
 
-        return [
-            score,
-            self.y_our_paddle,
-            self.x_ball,
-            self.y_pong,
-            self.x_ball_direction,
-            self.y_ball_direction,
-        ]
-
     def get_current_state(self):
         """
         :return: current environment state as array
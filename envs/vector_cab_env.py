@@ -0,0 +1,88 @@
+"""
+This module contains a batched version of the Cab Environment.
+It holds the states of many independent episodes in one integer array and steps all of them with a single gather
+over the compiled dynamics tables of a `CabEnv`.
+    `
+    from envs.cab_env import CabEnv
+    from envs.vector_cab_env import VectorCabEnv
+    vector_env = VectorCabEnv(CabEnv(), num_envs=4096)
+    states = vector_env.reset()
+    states, rewards, dones = vector_env.step(vector_env.sample_actions())
+    `
+"""
+import numpy as np
+
+
+class VectorCabEnv:
+    """
+    N independent Cab episodes stepped together.
+    Finished episodes are reset automatically from `init_state_distribution`, so the states returned by `step`
+    for those episodes are already the first states of their next episodes.
+    """
+
+    def __init__(self, env, num_envs, seed=None):
+        """
+        :param env: a `CabEnv` (or subclass) to take the dynamics tables from, the tables are shared, not copied
+        :param num_envs: number of parallel episodes
+        :param seed: random seed of the episode resets and action sampling
+        """
+        self.env = env
+        self.num_envs = num_envs
+        self.num_state = env.state_count
+        self.num_action = len(env.actions)
+
+        self.next_state_table = env.next_state_table
+        self.reward_table = env.reward_table
+        self.done_table = env.done_table
+        self.init_state_cdf = np.cumsum(env.init_state_distribution)
+
+        self.np_random = np.random.default_rng(seed)
+        self.states = self.sample_init_states(num_envs)
+
+    def seed(self, seed=None):
+        """
+        :param seed: random seed
+        :return: None
+        """
+        self.np_random = np.random.default_rng(seed)
+
+    def sample_init_states(self, count):
+        """
+        Sample initial states from the initial state distribution
+        :param count: number of states to sample
+        :return: state ids
+        """
+        states = np.searchsorted(
+            self.init_state_cdf, self.np_random.random(count), side="right"
+        )
+        return np.minimum(states, self.num_state - 1)
+
+    def sample_actions(self):
+        """
+        :return: one uniformly random action per episode
+        """
+        return self.np_random.integers(0, self.num_action, self.num_envs)
+
+    def reset(self):
+        """
+        Reset every episode
+        :return: states
+        """
+        self.states = self.sample_init_states(self.num_envs)
+        return self.states.copy()
+
+    def step(self, actions):
+        """
+        Step every episode with its own action
+        :param actions: integer array of shape (num_envs,)
+        :return: (states, rewards, dones), states of finished episodes are already reset
+        """
+        next_states = self.next_state_table[self.states, actions].astype(np.int64)
+        rewards = self.reward_table[self.states, actions]
+        dones = self.done_table[self.states, actions]
+
+        if dones.any():
+            next_states[dones] = self.sample_init_states(np.count_nonzero(dones))
+
+        self.states = next_states
+        return next_states.copy(), rewards, dones
@@ -0,0 +1,202 @@
+"""
+This module contains a batched version of the Pong Environment without Pygame.
+It holds the paddles, balls, directions, ball colours and scores of many independent games in arrays and applies
+the rules of `update_our_position`, `update_rival_position` and `update_observation` to all of them with masked
+array operations.
+    `
+    from envs.vector_pong_env import VectorPong
+    vector_env = VectorPong(num_games=256)
+    states = vector_env.reset()
+    states, scores = vector_env.step(vector_env.sample_actions())
+    `
+"""
+import numpy as np
+
+from envs.pong_env import (
+    BALL_SIZE,
+    BALL_SPEED,
+    COLOURS,
+    FRAME_STEP,
+    PADDLE_SIZE,
+    PADDLE_SPEED,
+    WINDOW_MARGIN,
+    WINDOW_SIZE,
+)
+
+# ball colours, indexed by `VectorPong.colour_ball`
+BALL_COLOURS = np.asarray([COLOURS.get("WHITE"), COLOURS.get("BLUE"), COLOURS.get("RED")])
+WHITE, BLUE, RED = 0, 1, 2
+
+# same ranges as `normalise_state` of dqn_pong_perform.py
+STATE_SCALE = np.asarray(
+    [WINDOW_SIZE.get("HEIGHT"), WINDOW_SIZE.get("WIDTH"), WINDOW_SIZE.get("HEIGHT"), 1.0, 1.0]
+)
+
+
+class VectorPong:
+    """
+    N independent Pong games stepped together with a fixed timestep, the same as a headless `PongGame`.
+    Pong games do not terminate, every game keeps running until `reset`.
+    """
+
+    def __init__(self, num_games, seed=None):
+        """
+        :param num_games: number of parallel games
+        :param seed: random seed of the initial ball directions and positions, and of action sampling
+        """
+        self.num_games = num_games
+        self.np_random = np.random.default_rng(seed)
+
+        self.y_our_paddle = np.zeros(num_games)
+        self.y_rival_paddle = np.zeros(num_games)
+        self.x_ball = np.zeros(num_games)
+        self.y_ball = np.zeros(num_games)
+        self.x_ball_direction = np.zeros(num_games)
+        self.y_ball_direction = np.zeros(num_games)
+        self.colour_ball = np.zeros(num_games, dtype=np.int8)
+        self.score_display = np.zeros(num_games)
+        self.reset()
+
+    def seed(self, seed=None):
+        """
+        :param seed: random seed
+        :return: None
+        """
+        self.np_random = np.random.default_rng(seed)
+
+    def reset(self, games=None):
+        """
+        Reset games the same way as `PongGame.__init__`
+        :param games: indices or boolean mask of the games to reset, every game if not given
+        :return: normalised states of every game
+        """
+        if games is None:
+            games = np.arange(self.num_games)
+        count = len(np.arange(self.num_games)[games])
+
+        self.y_our_paddle[games] = WINDOW_SIZE.get("HEIGHT") / 2 - PADDLE_SIZE.get("HEIGHT") / 2
+        self.y_rival_paddle[games] = WINDOW_SIZE.get("HEIGHT") / 2 - PADDLE_SIZE.get("HEIGHT") / 2
+        self.x_ball[games] = WINDOW_SIZE.get("WIDTH") / 2 - BALL_SIZE.get("WIDTH") / 2
+
+        # directions from a digit of 0-9: 0-2 (1, 1), 3-4 (-1, 1), 5-7 (1, -1), 8-9 (-1, -1)
+        seed = self.np_random.integers(0, 10, count)
+        self.x_ball_direction[games] = np.where(np.isin(seed, (3, 4, 8, 9)), -1.0, 1.0)
+        self.y_ball_direction[games] = np.where(seed >= 5, -1.0, 1.0)
+
+        seed = self.np_random.integers(0, 10, count)
+        self.y_ball[games] = seed * (WINDOW_SIZE.get("HEIGHT") - BALL_SIZE.get("HEIGHT")) / 9
+
+        self.colour_ball[games] = WHITE
+        self.score_display[games] = -10.0
+        return self.get_current_states()
+
+    def sample_actions(self):
+        """
+        :return: one uniformly random action per game
+        """
+        return self.np_random.integers(0, 3, self.num_games)
+
+    def get_current_states(self):
+        """
+        :return: normalised states of shape (num_games, 5), row by row equal to `normalise_state`
+        of `PongGame.get_current_state`
+        """
+        states = np.stack(
+            [
+                self.y_our_paddle,
+                self.x_ball,
+                self.y_ball,
+                self.x_ball_direction,
+                self.y_ball_direction,
+            ],
+            axis=1,
+        )
+        return states / STATE_SCALE
+
+    def ball_colours(self):
+        """
+        :return: RGB colour of every ball, shape (num_games, 3)
+        """
+        return BALL_COLOURS[self.colour_ball]
+
+    def step(self, actions):
+        """
+        Step every game with its own action: 0 stays, 1 moves our paddle up and 2 moves it down
+        :param actions: integer array of shape (num_games,)
+        :return: (states, scores), normalised states and the score of every game,
+        10 when our paddle hits the ball, -10 when the ball passes it, 0 otherwise
+        """
+        actions = np.asarray(actions)
+        paddle_step = PADDLE_SPEED * FRAME_STEP
+        max_paddle = WINDOW_SIZE.get("HEIGHT") - PADDLE_SIZE.get("HEIGHT")
+
+        # our paddle, see `update_our_position`
+        y_our = self.y_our_paddle - paddle_step * (actions == 1) + paddle_step * (actions == 2)
+        self.y_our_paddle = np.clip(y_our, 0, max_paddle)
+
+        # rival paddle follows the ball, the two checks are sequential as in `update_rival_position`
+        ball_centre = self.y_ball + BALL_SIZE.get("HEIGHT") / 2
+        y_rival = self.y_rival_paddle
+        y_rival = np.where(
+            y_rival + PADDLE_SIZE.get("HEIGHT") / 2 < ball_centre, y_rival + paddle_step, y_rival
+        )
+        y_rival = np.where(
+            y_rival + PADDLE_SIZE.get("HEIGHT") / 2 > ball_centre, y_rival - paddle_step, y_rival
+        )
+        self.y_rival_paddle = np.clip(y_rival, 0, max_paddle)
+
+        # ball, see `update_observation`
+        x_ball = self.x_ball + self.x_ball_direction * BALL_SPEED.get("X") * FRAME_STEP
+        y_ball = self.y_ball + self.y_ball_direction * BALL_SPEED.get("Y") * FRAME_STEP
+        x_direction = self.x_ball_direction.copy()
+        y_direction = self.y_ball_direction.copy()
+        scores = np.zeros(self.num_games)
+
+        reaches_paddle = (y_ball + BALL_SIZE.get("HEIGHT") >= self.y_our_paddle) & (
+            y_ball - BALL_SIZE.get("HEIGHT") <= self.y_our_paddle + PADDLE_SIZE.get("HEIGHT")
+        )
+        our_hit = (
+            (x_ball <= WINDOW_MARGIN + PADDLE_SIZE.get("WIDTH"))
+            & reaches_paddle
+            & (x_direction == -1)
+        )
+        our_miss = ~our_hit & (x_ball <= 0)
+        x_direction[our_hit | our_miss] = 1
+        scores[our_hit] = 10.0
+        scores[our_miss] = -10.0
+        self.colour_ball[our_hit] = BLUE
+        self.colour_ball[our_miss] = RED
+
+        # a missed ball skips the rest of the rules
+        reaches_rival = (y_ball + BALL_SIZE.get("HEIGHT") >= self.y_rival_paddle) & (
+            y_ball - BALL_SIZE.get("HEIGHT") <= self.y_rival_paddle + PADDLE_SIZE.get("HEIGHT")
+        )
+        rival_hit = (
+            ~our_miss
+            & (x_ball >= WINDOW_SIZE.get("WIDTH") - PADDLE_SIZE.get("WIDTH") - WINDOW_MARGIN)
+            & reaches_rival
+        )
+        right_wall = (
+            ~our_miss
+            & ~rival_hit
+            & (x_ball >= WINDOW_SIZE.get("WIDTH") - BALL_SIZE.get("WIDTH"))
+        )
+        x_direction[rival_hit | right_wall] = -1
+        self.colour_ball[rival_hit | right_wall] = WHITE
+
+        # a ball at the right wall skips the bounce on the top and bottom walls
+        bounces = ~our_miss & ~right_wall
+        top = bounces & (y_ball <= 0)
+        bottom = bounces & ~top & (y_ball >= WINDOW_SIZE.get("HEIGHT") - BALL_SIZE.get("HEIGHT"))
+        y_ball[top] = 0
+        y_direction[top] = 1
+        y_ball[bottom] = WINDOW_SIZE.get("HEIGHT") - BALL_SIZE.get("HEIGHT")
+        y_direction[bottom] = -1
+
+        self.x_ball, self.y_ball = x_ball, y_ball
+        self.x_ball_direction, self.y_ball_direction = x_direction, y_direction
+
+        # moving average of the scores, as `PongGame.score_display`
+        scored = scores != 0
+        self.score_display[scored] = 0.05 * scores[scored] + 0.95 * self.score_display[scored]
+        return self.get_current_states(), scores
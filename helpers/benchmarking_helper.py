@@ -0,0 +1,214 @@
+import time
+import random
+import numpy as np
+import pandas as pd
+
+from algo.basic_q_learning.early_stopping import EarlyStopping
+from algo.basic_q_learning.q_learning import q_learning, q_learning_batched
+from algo.dyna_q.dyna_q import dyna_q, prioritized_sweeping
+from algo.dynamic_programming.dynamic_programming import q_iteration
+from envs.cab_env import CabEnv
+from envs.vector_cab_env import VectorCabEnv
+
+
+def generate_cab_layout(num_y, num_x, location_names, wall_ratio=0.2, seed=None):
+    """
+    Generate a random Cab layout of the given grid size in the `LAYOUT` string format
+    :param num_y: number of rows
+    :param num_x: number of columns
+    :param location_names: names of the locations to place on distinct cells
+    :param wall_ratio: probability of a vertical wall between two neighbouring cells
+    :param seed: random seed
+    :return: list of layout strings
+    """
+    rng = random.Random(seed)
+    cells = rng.sample(range(num_y * num_x), len(location_names))
+    names = dict(zip(cells, location_names))
+
+    layout = ["+" + "-" * (num_x * 2 - 1) + "+"]
+    for _y in range(num_y):
+        row = "|"
+        for _x in range(num_x):
+            row += names.get(_y * num_x + _x, " ")
+            if _x < num_x - 1:
+                row += "|" if rng.random() < wall_ratio else ":"
+        layout.append(row + "|")
+    layout.append(layout[0])
+    return layout
+
+
+def make_cab_class(layout, location_names):
+    """
+    Create a `CabEnv` subclass on a custom layout, the same way `CabEnvV2` overrides the template
+    :param layout: list of layout strings
+    :param location_names: names of the locations in the layout
+    :return: environment class
+    """
+    return type(
+        "CabEnv{}x{}".format(len(layout) - 2, (len(layout[0]) - 1) // 2),
+        (CabEnv,),
+        {
+            "LAYOUT": layout,
+            "layout": np.asarray(layout, dtype="c"),
+            "location_names": location_names,
+        },
+    )
+
+
+def benchmark_cab_construction(
+    grid_sizes=(8, 16, 32, 64), location_names=("R", "G", "Y", "B", "K"), repeat=3
+):
+    """
+    Time the construction of Cab environments across square grid sizes
+    :param grid_sizes: side lengths of the grid
+    :param location_names: names of the locations to place on each layout
+    :param repeat: number of constructions per size, the best time is reported
+    :return: DataFrame with grid size, number of states and construction time in milliseconds
+    """
+    records = []
+    for grid_size in grid_sizes:
+        env_class = make_cab_class(
+            generate_cab_layout(grid_size, grid_size, list(location_names), seed=grid_size),
+            list(location_names),
+        )
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            env = env_class()
+            timings.append(time.perf_counter() - start)
+        records.append(
+            {
+                "grid_size": grid_size,
+                "num_states": env.state_count,
+                "construction_ms": min(timings) * 1000,
+            }
+        )
+    return pd.DataFrame(records)
+
+
+def benchmark_cab_stepping(num_envs_list=(1, 256, 4096, 65536), num_steps=200):
+    """
+    Measure the env-step throughput of `CabEnv.step` against `VectorCabEnv.step` with random actions
+    :param num_envs_list: numbers of parallel episodes for the vectorised environment
+    :param num_steps: number of steps (calls) to time for each setting
+    :return: DataFrame with the mode, number of episodes and env-steps per second
+    """
+    env = CabEnv()
+    records = []
+
+    env.reset()
+    actions = np.random.randint(0, len(env.actions), num_steps * 100)
+    start = time.perf_counter()
+    for action in actions:
+        if env.step(action)[2]:
+            env.reset()
+    records.append(
+        {
+            "mode": "CabEnv",
+            "num_envs": 1,
+            "steps_per_second": len(actions) / (time.perf_counter() - start),
+        }
+    )
+
+    for num_envs in num_envs_list:
+        vector_env = VectorCabEnv(env, num_envs, seed=num_envs)
+        start = time.perf_counter()
+        for _ in range(num_steps):
+            vector_env.step(vector_env.sample_actions())
+        records.append(
+            {
+                "mode": "VectorCabEnv",
+                "num_envs": num_envs,
+                "steps_per_second": num_envs * num_steps / (time.perf_counter() - start),
+            }
+        )
+    return pd.DataFrame(records)
+
+
+def benchmark_q_learning(max_eps=20000, num_envs=256, alpha=0.3, gamma=0.9):
+    """
+    Compare the Q-table update throughput of `q_learning` and `q_learning_batched` on `CabEnv`
+    :param max_eps: number of training episodes for each run
+    :param num_envs: number of parallel episodes of the batched run
+    :param alpha: learning rate
+    :param gamma: discount factor
+    :return: DataFrame with the mode, wall-clock seconds and updates per second
+    """
+    env = CabEnv()
+    penalty = env.reward_dict.get("penalty")
+    records = []
+    for mode, train in [
+        ("q_learning", lambda: q_learning(env, penalty, max_eps, alpha, gamma, 1.0)),
+        (
+            "q_learning_batched",
+            lambda: q_learning_batched(
+                env, penalty, max_eps, alpha, gamma, 1.0, num_envs=num_envs
+            ),
+        ),
+    ]:
+        start = time.perf_counter()
+        _, training_info = train()
+        seconds = time.perf_counter() - start
+        records.append(
+            {
+                "mode": mode,
+                "seconds": seconds,
+                "updates_per_second": training_info["num_steps"].sum() / seconds,
+            }
+        )
+    return pd.DataFrame(records)
+
+
+def benchmark_cab_planners(
+    max_eps=5000, planning_steps=10, epsilon=0.2, alpha=0.5, gamma=0.9, match_rate=0.99
+):
+    """
+    Compare how many real episodes and how much wall-clock `q_learning`, `dyna_q` and `prioritized_sweeping`
+    need to reach the optimal Cab policy, the optimum comes from `q_iteration`
+    :param max_eps: maximum number of episodes of each run
+    :param planning_steps: planning budget per real step
+    :param epsilon: constant exploration rate
+    :param alpha: learning rate
+    :param gamma: discount factor
+    :param match_rate: share of start states whose greedy action has to be optimal
+    :return: DataFrame with the mode, stop reason, episodes, real env-steps, planning updates and seconds
+    """
+    env = CabEnv()
+    penalty = env.reward_dict.get("penalty")
+    optimal_q, _ = q_iteration(env, gamma)
+    start_states = np.flatnonzero(env.init_state_distribution)
+
+    records = []
+    for mode, train, kwargs in [
+        ("q_learning", q_learning, {}),
+        ("dyna_q", dyna_q, {"planning_steps": planning_steps}),
+        ("prioritized_sweeping", prioritized_sweeping, {"planning_steps": planning_steps}),
+    ]:
+        early_stopping = EarlyStopping(
+            reference_policy=optimal_q, states=start_states, match_rate=match_rate
+        )
+        start = time.perf_counter()
+        _, training_info = train(
+            env,
+            penalty,
+            max_eps,
+            alpha,
+            gamma,
+            epsilon,
+            strategy="exponential",
+            epsilon_decay=1.0,
+            progress=None,
+            early_stopping=early_stopping,
+            **kwargs
+        )
+        records.append(
+            {
+                "mode": mode,
+                "stop_reason": training_info.attrs.get("stop_reason"),
+                "episodes": training_info.attrs.get("stop_episode"),
+                "env_steps": training_info["num_steps"].sum(),
+                "planning_updates": training_info.attrs.get("planning_updates", 0),
+                "seconds": time.perf_counter() - start,
+            }
+        )
+    return pd.DataFrame(records)
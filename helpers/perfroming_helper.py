@@ -1,7 +1,10 @@
 import numpy as np
+import pandas as pd
 
+from helpers.tracing_helper import EpisodeTraces
 
-def cab_perform(env, q_table, reward_dict, num_episodes):
+
+def cab_perform(env, q_table, reward_dict, num_episodes, max_steps=200):
     sequences = []
     for _ in range(num_episodes):
         state = env.reset()
@@ -9,7 +12,8 @@ def cab_perform(env, q_table, reward_dict, num_episodes):
 
         termination = False
 
-        while not termination:
+        # a greedy policy can loop forever, so we cap the episode length
+        while not termination and total_step < max_steps:
             action = np.argmax(q_table[state])
             state, reward, termination, _ = env.step(action)
 
@@ -30,3 +34,115 @@ def cab_perform(env, q_table, reward_dict, num_episodes):
             total_step += 1
 
     return sequences
+
+
+def cab_record(env, q_table, num_episodes, max_steps=200):
+    """
+    Run greedy episodes of a Q-table all at once over the dynamics tables and record them as compact traces.
+    Nothing is rendered here, frames are rendered on demand by `EpisodeTraces.frames`.
+    :param env: environment with compiled dynamics tables and `init_state_distribution`
+    :param q_table: Q-table to perform
+    :param num_episodes: number of episodes
+    :param max_steps: maximum number of steps per episode
+    :return: EpisodeTraces
+    """
+    policy = np.argmax(q_table, axis=1)
+    start_states = env.np_random.choice(
+        len(env.init_state_distribution), num_episodes, p=env.init_state_distribution
+    )
+
+    states_record = np.zeros((num_episodes, max_steps), dtype=np.int32)
+    actions_record = np.zeros((num_episodes, max_steps), dtype=np.int8)
+    rewards_record = np.zeros((num_episodes, max_steps), dtype=env.reward_table.dtype)
+    total_step = np.zeros(num_episodes, dtype=np.int64)
+
+    states = start_states
+    active = np.ones(num_episodes, dtype=bool)
+    for step in range(max_steps):
+        if not active.any():
+            break
+        actions = policy[states]
+        states_record[:, step] = env.next_state_table[states, actions]
+        actions_record[:, step] = actions
+        rewards_record[:, step] = env.reward_table[states, actions]
+        total_step += active
+        active &= ~env.done_table[states, actions]
+        states = states_record[:, step]
+
+    # keep only the steps of each episode, episode by episode
+    recorded = np.arange(max_steps) < total_step[:, None]
+    return EpisodeTraces(
+        start_states,
+        states_record[recorded],
+        actions_record[recorded],
+        rewards_record[recorded],
+        np.concatenate([[0], np.cumsum(total_step)]),
+    )
+
+
+def cab_evaluate(env, q_table, reward_dict, horizon=200):
+    """
+    Evaluate the greedy policy of a Q-table exactly, following it from every start state at once
+    over the dynamics tables of the environment, without rendering.
+    As the environment is deterministic, a state visited twice means the policy loops forever,
+    which is detected with Brent's algorithm on every trajectory.
+    :param env: environment with compiled dynamics tables and `init_state_distribution`
+    :param q_table: Q-table to evaluate
+    :param reward_dict: reward dictionary of the environment, to count penalties
+    :param horizon: maximum number of steps per episode
+    :return: dictionary
+        "expected_return", "expected_steps", "expected_penalties": weighted by `init_state_distribution`,
+            episodes which do not terminate are counted until they are cut off
+        "episodes": DataFrame with one row per start state
+        "non_terminating": list of start states from which the policy never terminates (or exceeds `horizon`)
+    """
+    policy = np.argmax(q_table, axis=1)
+    start_states = np.flatnonzero(env.init_state_distribution)
+    weights = env.init_state_distribution[start_states]
+
+    num_start = len(start_states)
+    states = start_states.copy()
+    total_step = np.zeros(num_start, dtype=np.int64)
+    penalties = np.zeros(num_start, dtype=np.int64)
+    total_reward = np.zeros(num_start, dtype=env.reward_table.dtype)
+    terminated = np.zeros(num_start, dtype=bool)
+    looping = np.zeros(num_start, dtype=bool)
+
+    # Brent's cycle detection: compare with a saved state, saved again at every power of two steps
+    saved_states = states.copy()
+    power = 1
+
+    for step in range(1, horizon + 1):
+        active = ~(terminated | looping)
+        if not active.any():
+            break
+        actions = policy[states]
+        rewards = env.reward_table[states, actions]
+
+        total_step += active
+        penalties += active & (rewards == reward_dict.get("penalty"))
+        total_reward += np.where(active, rewards, 0)
+        terminated |= active & env.done_table[states, actions]
+        states = np.where(active, env.next_state_table[states, actions], states)
+
+        looping |= ~terminated & (states == saved_states)
+        if step == power:
+            saved_states = states.copy()
+            power *= 2
+
+    episodes = pd.DataFrame(
+        {
+            "start_state": start_states,
+            "num_steps": total_step,
+            "num_penalties": penalties,
+            "total_rewards": total_reward,
+            "terminated": terminated,
+        }
+    )
+    return {
+        "expected_return": float(np.sum(weights * total_reward)),
+        "expected_steps": float(np.sum(weights * total_step)),
+        "expected_penalties": float(np.sum(weights * penalties)),
+        "episodes": episodes,
+        "non_terminating": start_states[~terminated].tolist(),
+    }
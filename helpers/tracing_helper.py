@@ -0,0 +1,103 @@
+import numpy as np
+
+
+class EpisodeTraces:
+    """
+    Compact record of many episodes: only state ids, actions and rewards are kept, as typed arrays.
+    All episodes are concatenated and `offsets[i]:offsets[i + 1]` is the slice of episode `i`.
+    Frames are rendered from the environment only when they are viewed.
+    """
+
+    def __init__(self, start_states, states, actions, rewards, offsets):
+        """
+        :param start_states: first state of each episode
+        :param states: state after each step
+        :param actions: action of each step
+        :param rewards: reward of each step
+        :param offsets: start of each episode in the step arrays, with the total number of steps appended
+        """
+        self.start_states = np.asarray(start_states, dtype=np.int32)
+        self.states = np.asarray(states, dtype=np.int32)
+        self.actions = np.asarray(actions, dtype=np.int8)
+        self.rewards = np.asarray(rewards)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.start_states)
+
+    @property
+    def num_steps(self):
+        """
+        :return: number of steps of each episode
+        """
+        return np.diff(self.offsets)
+
+    @property
+    def total_rewards(self):
+        """
+        :return: accumulated reward of each episode
+        """
+        cumulative = np.concatenate([[0], np.cumsum(self.rewards)])
+        return cumulative[self.offsets[1:]] - cumulative[self.offsets[:-1]]
+
+    def episode(self, index):
+        """
+        :param index: episode index
+        :return: (states, actions, rewards) of the episode
+        """
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.states[start:end], self.actions[start:end], self.rewards[start:end]
+
+    def save(self, path):
+        """
+        Save all episodes into one `.npz` file
+        :param path: file path
+        :return: None
+        """
+        np.savez_compressed(
+            path,
+            start_states=self.start_states,
+            states=self.states,
+            actions=self.actions,
+            rewards=self.rewards,
+            offsets=self.offsets,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        :param path: file path written by `save`
+        :return: EpisodeTraces
+        """
+        with np.load(path) as data:
+            return cls(
+                data["start_states"],
+                data["states"],
+                data["actions"],
+                data["rewards"],
+                data["offsets"],
+            )
+
+    def frames(self, env, index, start=0, stop=None):
+        """
+        Render the frames of one episode lazily, the environment state is restored afterwards
+        :param env: environment used to record the episode
+        :param index: episode index
+        :param start: first step to render (seek)
+        :param stop: step to stop before, the end of the episode if not given
+        :return: generator of dictionaries in the same format as `cab_perform`
+        """
+        states, actions, rewards = self.episode(index)
+        total_rewards = np.cumsum(rewards)
+        saved_state, saved_action = env.s, env.lastaction
+        try:
+            for step in range(start, len(states) if stop is None else stop):
+                env.s, env.lastaction = int(states[step]), int(actions[step])
+                yield {
+                    "_rendered": env.render(mode="ansi"),
+                    "_state": int(states[step]),
+                    "_action": int(actions[step]),
+                    "_total_reward": total_rewards[step].item(),
+                }
+        finally:
+            env.s, env.lastaction = saved_state, saved_action
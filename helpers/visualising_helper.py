@@ -57,6 +57,26 @@ def display_(sequences) -> None:
         print(f"Reward: {sequence['_total_reward']}")
         time.sleep(1)
 
+def display_trace(traces, env, episode=0, start=0, stop=None, fps=1.0) -> None:
+    """
+    Replay one episode of `EpisodeTraces`, frames are rendered only when shown
+    :param traces: EpisodeTraces
+    :param env: environment used to record the traces
+    :param episode: episode index
+    :param start: step to start from (seek)
+    :param stop: step to stop before, the end of the episode if not given
+    :param fps: frames per second, no delay if 0 or None
+    :return: None
+    """
+    for sequence in traces.frames(env, episode, start, stop):
+        clear(wait=True)
+        print(sequence["_rendered"])
+        print(f"State: {sequence['_state']}")
+        print(f"Action: {sequence['_action']}")
+        print(f"Reward: {sequence['_total_reward']}")
+        if fps:
+            time.sleep(1 / fps)
+
 def display_atari(img):
     plt.imshow(img.astype(int))
     plt.show()
@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# an actor started with "spawn" imports the main module again, as the actors of `perform_actor_learner` do
+SCRIPT = """
+import multiprocessing
+import sys
+
+import dqn_pong_perform
+from algo.dqn_pygame_pong import actor_learner
+
+
+def tensorflow_loaded(result):
+    result.put("tensorflow" in sys.modules)
+
+
+if __name__ == "__main__":
+    context = multiprocessing.get_context("spawn")
+    result = context.Queue()
+    actor = context.Process(target=tensorflow_loaded, args=(result,))
+    actor.start()
+    print(result.get(timeout=120))
+    actor.join()
+"""
+
+
+def test_actors_do_not_import_tensorflow(tmp_path):
+    script = tmp_path / "start_actor.py"
+    script.write_text(SCRIPT)
+    output = subprocess.run(
+        [sys.executable, str(script)],
+        cwd=REPO_ROOT,
+        env=dict(os.environ, PYTHONPATH=REPO_ROOT),
+        capture_output=True,
+        text=True,
+        check=True,
+        timeout=300,
+    )
+    assert output.stdout.strip().splitlines()[-1] == "False"
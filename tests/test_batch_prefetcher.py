@@ -0,0 +1,42 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from algo.dqn_pygame_pong.batch_prefetcher import BatchPrefetcher
+from algo.dqn_pygame_pong.replay_memory import ReplayMemory
+
+
+def test_first_batch_after_warmup_is_full():
+    memory = ReplayMemory(1000, state_count=5, seed=0)
+    lock = threading.Lock()
+    prefetcher = BatchPrefetcher(memory, 128, lock)
+    try:
+        # warm-up frames arrive one by one while the prefetcher thread is running
+        for frame in range(800):
+            with lock:
+                memory.memorise((np.full(5, frame), frame % 3, 0.0, np.full(5, frame + 1)))
+            if frame < 4:
+                time.sleep(0.05)
+
+        sizes = [len(prefetcher.get()[0]) for _ in range(4)]
+    finally:
+        prefetcher.stop()
+    assert sizes == [128, 128, 128, 128]
+
+
+def test_sampling_error_is_raised_by_get():
+    memory = ReplayMemory(1000, state_count=5, seed=0)
+    memory.memorise((np.zeros(5), 0, 0.0, np.zeros(5)))
+
+    def sample_indices(_batch_size):
+        raise RuntimeError("sampling failed")
+
+    memory.sample_indices = sample_indices
+    prefetcher = BatchPrefetcher(memory, 128, threading.Lock())
+    try:
+        with pytest.raises(RuntimeError, match="sampling failed"):
+            prefetcher.get()
+    finally:
+        prefetcher.stop()
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from envs.cab_env import CabEnv
+from envs.cab_env_v2 import CabEnvV2
+
+
+def loop_dynamics(env):
+    """
+    The state-action map and initial state distribution built one state-action at a time,
+    as `CabEnv` did before its layout was compiled
+    """
+    init_state_distribution = np.zeros(env.state_count)
+    P = {state: {action: [] for action in env.actions} for state in range(env.state_count)}
+    for _y in range(env.num_y):
+        for _x in range(env.num_x):
+            for passenger_id in env.passenger_ids:
+                for destination_id in env.location_ids:
+                    state = env.generate_state_id(_y, _x, passenger_id, destination_id)
+                    if passenger_id < env.num_location and passenger_id != destination_id:
+                        init_state_distribution[state] += 1
+
+                    for action in env.actions:
+                        new_y, new_x, new_passenger_id = _y, _x, passenger_id
+                        reward = env.reward_dict.get("step")
+                        termination = False
+                        cab_location = (_y, _x)
+
+                        if action == 0:
+                            new_y = min(_y + 1, env.x_max)
+                        elif action == 1:
+                            new_y = max(_y - 1, 0)
+                        elif action == 2 and env.layout[_y + 1, _x * 2 + 2] == b":":
+                            new_x = min(_x + 1, env.y_max)
+                        elif action == 3 and env.layout[_y + 1, _x * 2] == b":":
+                            new_x = max(_x - 1, 0)
+                        elif action == 4:
+                            if (passenger_id < env.num_location) and (
+                                cab_location == env.locations[passenger_id]
+                            ):
+                                new_passenger_id = env.passenger_ids[-1]
+                            else:
+                                reward = env.reward_dict.get("penalty")
+                        elif action == 5:
+                            if (cab_location == env.locations[destination_id]) and (
+                                passenger_id == env.passenger_ids[-1]
+                            ):
+                                new_passenger_id = destination_id
+                                termination = True
+                                reward = env.reward_dict.get("final_reward")
+                            elif (cab_location in env.locations) and (
+                                passenger_id == env.passenger_ids[-1]
+                            ):
+                                new_passenger_id = env.locations.index(cab_location)
+                            else:
+                                reward = env.reward_dict.get("penalty")
+
+                        new_state = env.generate_state_id(
+                            new_y, new_x, new_passenger_id, destination_id
+                        )
+                        P[state][action].append((1.0, new_state, reward, termination))
+
+    init_state_distribution /= init_state_distribution.sum()
+    return P, init_state_distribution
+
+
+@pytest.mark.parametrize("env_class", [CabEnv, CabEnvV2])
+def test_compiled_dynamics_match_loop(env_class):
+    env = env_class()
+    P, init_state_distribution = loop_dynamics(env)
+
+    assert env.P == P
+    np.testing.assert_array_equal(env.init_state_distribution, init_state_distribution)
+
+    # the dense tables hold the same transitions
+    for state in range(env.state_count):
+        for action in env.actions:
+            [(_, new_state, reward, termination)] = P[state][action]
+            assert env.next_state_table[state, action] == new_state
+            assert env.reward_table[state, action] == reward
+            assert env.done_table[state, action] == termination
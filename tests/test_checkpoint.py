@@ -0,0 +1,39 @@
+import os
+
+import numpy as np
+
+from algo.basic_q_learning.checkpoint import load_checkpoint, save_checkpoint
+
+
+def save(checkpoint_dir, episode):
+    return save_checkpoint(
+        checkpoint_dir, np.full((2, 2), episode), {"episode": episode}, {}, keep=2
+    )
+
+
+def test_shorter_run_keeps_its_latest_checkpoint(tmp_path):
+    checkpoint_dir = str(tmp_path)
+    # an earlier, longer run leaves higher-numbered checkpoints behind
+    for episode in range(100, 401, 100):
+        save(checkpoint_dir, episode)
+    save(checkpoint_dir, 100)
+
+    checkpoint = load_checkpoint(checkpoint_dir)
+    assert checkpoint.get("state").get("episode") == 100
+    assert checkpoint.get("q_table")[0, 0] == 100
+
+
+def test_older_checkpoints_are_pruned(tmp_path):
+    checkpoint_dir = str(tmp_path)
+    for episode in range(100, 501, 100):
+        save(checkpoint_dir, episode)
+
+    assert sorted(os.listdir(checkpoint_dir)) == [
+        "LATEST",
+        "episode-000000400",
+        "episode-000000500",
+    ]
+    # saving the same episode again replaces it
+    save(checkpoint_dir, 500)
+    assert load_checkpoint(checkpoint_dir).get("state").get("episode") == 500
+    assert len(os.listdir(checkpoint_dir)) == 3
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from algo.basic_q_learning.training_metrics import TrainingMetrics
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs q_learning with checkpoints and Parquet streaming, and kills the process without any cleanup
+# a few episodes after the episode-600 checkpoint
+RUN = """
+import os, random, sys
+import numpy as np
+from algo.basic_q_learning.q_learning import q_learning
+from envs.cab_env import CabEnv
+
+def crash(episode, max_eps):
+    if episode == int(sys.argv[3]):
+        os._exit(0)
+
+random.seed(0)
+env = CabEnv()
+env.seed(0)
+env.action_space.seed(0)
+q_learning(env, -30, 1000, 0.1, 0.9, 1.0, metrics_path=sys.argv[1], chunk_size=150,
+           progress=crash, progress_every=50, checkpoint_dir=sys.argv[2], checkpoint_every=200)
+"""
+
+
+def run_q_learning(metrics_path, checkpoint_dir, crash_episode):
+    subprocess.run(
+        [sys.executable, "-c", RUN, metrics_path, checkpoint_dir, str(crash_episode)],
+        cwd=REPO_ROOT,
+        env=dict(os.environ, PYTHONPATH=REPO_ROOT),
+        check=True,
+    )
+
+
+def test_parquet_run_resumes_after_crash(tmp_path):
+    pytest.importorskip("pyarrow")
+    from algo.basic_q_learning.q_learning import q_learning
+    from envs.cab_env import CabEnv
+
+    # uninterrupted run to compare with
+    full_path = str(tmp_path / "full.parquet")
+    run_q_learning(full_path, str(tmp_path / "full_checkpoints"), crash_episode=-1)
+    expected = TrainingMetrics(1000, {}, full_path).read()
+
+    metrics_path = str(tmp_path / "run.parquet")
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    run_q_learning(metrics_path, checkpoint_dir, crash_episode=650)
+
+    _, training_info = q_learning(
+        CabEnv(), -30, 1000, 0.1, 0.9, 1.0, metrics_path=metrics_path, chunk_size=150,
+        progress=None, resume_from=checkpoint_dir,
+    )
+    pd.testing.assert_frame_equal(training_info, expected)
+
+
+def test_restore_streamed_state_without_path():
+    metrics = TrainingMetrics(10, {"num_steps": np.int64})
+    state = {"num_flushed": 5, "arrays": {"episode": np.arange(6, 8)}}
+    with pytest.raises(ValueError):
+        metrics.restore(state)
@@ -0,0 +1,48 @@
+import random
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pygame")
+
+from envs.pong_env import PongGame
+from envs.vector_pong_env import STATE_SCALE, VectorPong
+
+
+def test_vector_pong_matches_pong_games():
+    num_games, num_steps = 50, 3000
+    random.seed(0)
+    games = [PongGame() for _ in range(num_games)]
+
+    # start every vectorised game from the state of its `PongGame`
+    vector_env = VectorPong(num_games, seed=0)
+    vector_env.x_ball[:] = [game.x_ball for game in games]
+    vector_env.y_ball[:] = [game.y_pong for game in games]
+    vector_env.x_ball_direction[:] = [game.x_ball_direction for game in games]
+    vector_env.y_ball_direction[:] = [game.y_ball_direction for game in games]
+
+    np_random = np.random.default_rng(0)
+    hits, misses = 0, 0
+    for _ in range(num_steps):
+        actions = np_random.integers(0, 3, num_games)
+        states, scores = vector_env.step(actions)
+        observations = [game.take_action(action) for game, action in zip(games, actions)]
+
+        np.testing.assert_array_equal(scores, [observation[0] for observation in observations])
+        np.testing.assert_array_equal(
+            states, np.asarray([game.get_current_state() for game in games]) / STATE_SCALE
+        )
+        np.testing.assert_array_equal(
+            vector_env.y_rival_paddle, [game.y_rival_paddle for game in games]
+        )
+        np.testing.assert_array_equal(
+            vector_env.score_display, [game.score_display for game in games]
+        )
+        np.testing.assert_array_equal(
+            vector_env.ball_colours(), [game.colour_ball for game in games]
+        )
+        hits += np.count_nonzero(scores == 10.0)
+        misses += np.count_nonzero(scores == -10.0)
+
+    # the games went through both hits and misses
+    assert hits > 0 and misses > 0